@@ -1,4 +1,6 @@
 import os
+import asyncio
+import queue
 from pathlib import Path
 # from dotenv import load_dotenv
 
@@ -8,16 +10,32 @@ from pathlib import Path
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response
+import orjson
 import logging
+from logging.handlers import QueueHandler, QueueListener
 
 from .routers import chat, documents
+from .services.document_processor import shutdown_process_pool
+from .services.database import db_service
+from .services.embedding_service import embedding_service
+from .utils import rerank
 
-# Configure logging
+# Configure logging: records are queued and written by a background thread,
+# so request handlers never block on stream I/O
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+log_listener = QueueListener(log_queue, log_handler)
+# Only the listener's handler formats; a prefixed message here would be formatted twice
+queue_handler = QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter("%(message)s"))
 logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    level=os.getenv("LOG_LEVEL", "WARNING").upper(),
+    handlers=[queue_handler]
 )
+log_listener.start()
 
 logger = logging.getLogger(__name__)
 
@@ -27,13 +45,37 @@ app = FastAPI(
     description="RAG-powered economic research chatbot for Alberta business insights",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
-# Add CORS middleware
+# Allowed CORS origins, comma separated (e.g. "https://app.vercel.app,http://localhost:3000")
+allowed_origins = [
+    origin.strip()
+    for origin in os.getenv("ALLOWED_ORIGINS", "*").split(",")
+    if origin.strip()
+]
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """GZip responses except on excluded paths (GzipFile buffers streamed events until the response ends)"""
+    
+    def __init__(self, app, excluded_paths=(), **kwargs):
+        super().__init__(app, **kwargs)
+        self.excluded_paths = frozenset(excluded_paths)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# Compress larger JSON payloads (document listings, query sources); streamed answers go out uncompressed
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=1000, excluded_paths=("/api/chat/query/stream",))
+
+# Add CORS middleware last so it is the outermost (pure ASGI) layer
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production, specify exact origins
+    allow_origins=allowed_origins,  # In production, specify exact origins
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -43,40 +85,78 @@ app.add_middleware(
 app.include_router(chat.router)
 app.include_router(documents.router)
 
+# Static payloads are serialized once at import time
+DEBUG = os.getenv("DEBUG") == "true"
+
+ROOT_PAYLOAD = orjson.dumps({
+    "message": "Alberta Perspectives RAG API",
+    "version": "1.0.0",
+    "description": "RAG-powered economic research chatbot for Alberta business insights",
+    "endpoints": {
+        "chat": "/api/chat",
+        "documents": "/api/documents",
+        "docs": "/docs"
+    }
+})
+
+HEALTH_PAYLOAD = orjson.dumps({
+    "status": "healthy",
+    "service": "rag-api"
+})
+
 @app.get("/")
 async def root():
     """Root endpoint with system information"""
-    return {
-        "message": "Alberta Perspectives RAG API",
-        "version": "1.0.0",
-        "description": "RAG-powered economic research chatbot for Alberta business insights",
-        "endpoints": {
-            "chat": "/api/chat",
-            "documents": "/api/documents",
-            "docs": "/docs"
-        }
-    }
+    return Response(content=ROOT_PAYLOAD, media_type="application/json")
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "service": "rag-api"
-    }
+    return Response(content=HEALTH_PAYLOAD, media_type="application/json")
+
+@app.on_event("startup")
+async def log_event_loop():
+    """Log the active event loop implementation (uvloop when available)"""
+    logger.warning(f"Event loop: {asyncio.get_running_loop().__class__.__module__}")
+
+@app.on_event("startup")
+async def sync_vector_mirror():
+    """Backfill the optional Qdrant mirror from Supabase without delaying startup"""
+    db_service.start_qdrant_sync()
+
+@app.on_event("startup")
+async def warm_up_rerank():
+    """Compile the MMR kernel now rather than inside the first user query"""
+    await asyncio.to_thread(rerank.warm_up)
+
+@app.on_event("shutdown")
+async def shutdown_executors():
+    """Release worker pools used for PDF processing and embeddings, and flush queued logs"""
+    shutdown_process_pool()
+    await embedding_service.aclose()
+    log_listener.stop()
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
     """Global exception handler"""
     logger.error(f"Unhandled exception: {str(exc)}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "detail": "An unexpected error occurred",
-            "error": str(exc) if os.getenv("DEBUG") == "true" else "Internal server error"
+            "error": str(exc) if DEBUG else "Internal server error"
         }
     )
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=True,
+        loop="uvloop",  # libuv-backed event loop (uvicorn[standard])
+        http="httptools",  # C HTTP parser instead of pure-Python h11
+        access_log=False,
+        log_level="warning"
+    )
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException
-from typing import Dict, Any
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import AsyncIterator, Dict, Any
 import logging
+import orjson
 from ..models.document import QueryRequest, QueryResponse
 from ..services.rag_service import rag_service
 
@@ -9,7 +11,7 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
 @router.post("/query", response_model=QueryResponse)
-async def process_query(request: QueryRequest) -> QueryResponse:
+async def process_query(request: QueryRequest) -> ORJSONResponse:
     """Process a user query and return RAG-generated response"""
     try:
         if not request.query.strip():
@@ -21,16 +23,33 @@ async def process_query(request: QueryRequest) -> QueryResponse:
             max_results=request.max_results or 5
         )
         
-        return QueryResponse(
-            answer=result["answer"],
-            sources=result["sources"],
-            confidence=result.get("confidence")
-        )
+        # rag_service already produces the QueryResponse shape; returning a Response
+        # directly skips FastAPI's response_model validation pass (kept for the OpenAPI schema)
+        return ORJSONResponse(content={
+            "answer": result["answer"],
+            "sources": result["sources"],
+            "confidence": result.get("confidence")
+        })
         
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error while processing query")
 
+@router.post("/query/stream")
+async def stream_query(request: QueryRequest) -> StreamingResponse:
+    """Stream a RAG response as newline-delimited JSON: sources, answer tokens, then confidence"""
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    
+    async def _events() -> AsyncIterator[bytes]:
+        async for event in rag_service.stream_query(
+            query=request.query,
+            max_results=request.max_results or 5
+        ):
+            yield orjson.dumps(event) + b"\n"
+    
+    return StreamingResponse(_events(), media_type="application/x-ndjson")
+
 @router.get("/status")
 async def get_chat_status() -> Dict[str, Any]:
     """Get status of the RAG system components"""
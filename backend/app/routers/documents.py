@@ -1,10 +1,16 @@
 from fastapi import APIRouter, File, UploadFile, HTTPException
 from typing import Dict, Any, List
+from io import BytesIO
+import os
 import logging
 from ..utils.file_processor import file_processor
 
 logger = logging.getLogger(__name__)
 
+# Upload limits (bytes)
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(50 * 1024 * 1024)))
+UPLOAD_READ_SIZE = 1 << 16
+
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
 @router.post("/upload")
@@ -18,8 +24,18 @@ async def upload_document(file: UploadFile = File(...)) -> Dict[str, Any]:
         if not file.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="File must have .pdf extension")
         
-        # Read file content
-        file_content = await file.read()
+        # Read file content in bounded chunks, rejecting oversized uploads early
+        buffer = BytesIO()
+        size = 0
+        while True:
+            chunk = await file.read(UPLOAD_READ_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_UPLOAD_SIZE:
+                raise HTTPException(status_code=413, detail=f"File exceeds maximum size of {MAX_UPLOAD_SIZE // (1024 * 1024)} MB")
+            buffer.write(chunk)
+        file_content = buffer.getvalue()
         
         if len(file_content) == 0:
             raise HTTPException(status_code=400, detail="File is empty")
@@ -70,10 +86,10 @@ async def process_sample_documents() -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail="Error processing sample documents")
 
 @router.get("/status")
-async def get_processing_status() -> Dict[str, Any]:
-    """Get document processing status"""
+async def get_processing_status(include_documents: bool = False) -> Dict[str, Any]:
+    """Get document processing status (pass include_documents=true for the document list)"""
     try:
-        status = await file_processor.get_processing_status()
+        status = await file_processor.get_processing_status(include_documents)
         return status
     except Exception as e:
         logger.error(f"Error getting processing status: {str(e)}")
@@ -83,7 +99,7 @@ async def get_processing_status() -> Dict[str, Any]:
 async def list_documents() -> Dict[str, Any]:
     """List all documents in the system"""
     try:
-        status = await file_processor.get_processing_status()
+        status = await file_processor.get_processing_status(include_documents=True)
         return {
             "documents": status.get("documents", []),
             "total": status.get("total_documents", 0),
@@ -1,13 +1,62 @@
 import os
+import asyncio
+import time
 from typing import List, Optional, Dict, Any
+import logging
+import numpy as np
+import orjson
 from supabase import create_client, Client
-from datetime import datetime
-import json
+from postgrest.types import CountMethod, ReturnMethod
+from .vector_index import create_vector_index, load_embedding_rows
+from .embedding_service import is_normalized, to_halfvec_text, to_list
+
+try:
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import (
+        Distance, PointStruct, ScalarQuantization, ScalarQuantizationConfig, ScalarType, VectorParams
+    )
+    QDRANT_AVAILABLE = True
+except ImportError:
+    QDRANT_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "chunks")
+
+# Points per upsert request when backfilling Qdrant from Supabase
+QDRANT_BACKFILL_BATCH_SIZE = 1000
+
+# Search a binary-quantized index and re-rank candidates exactly (see setup_database.sql)
+VECTOR_SEARCH_QUANTIZED = os.getenv("VECTOR_SEARCH_QUANTIZED", "false").lower() == "true"
+
+# Seconds a corpus version read from the database is reused before checking again
+CORPUS_VERSION_TTL = float(os.getenv("CORPUS_VERSION_TTL", "10"))
+
+def _parse_vector(vector: Any) -> Optional[np.ndarray]:
+    """Decode a pgvector value (returned in its text form, e.g. "[0.1,0.2,...]")"""
+    if vector is None:
+        return None
+    return np.asarray(orjson.loads(vector) if isinstance(vector, str) else vector, dtype=np.float32)
 
 class DatabaseService:
     def __init__(self):
         self.supabase = None
+        self.qdrant = None
+        self._qdrant_collection_ready = False
+        # Searches go to Qdrant only once it holds every stored embedding (see sync_qdrant)
+        self._qdrant_search_ready = False
+        self._qdrant_dirty = False  # Set when a mirror write fails during a sync
+        self._qdrant_sync_task: Optional[asyncio.Task] = None
+        # Fingerprint of the searchable documents, so query caches can invalidate (see get_corpus_version)
+        self._corpus_version: Optional[str] = None
+        self._corpus_version_expires = 0.0
         self._initialize_client()
+        if QDRANT_AVAILABLE:
+            self._initialize_qdrant()
+        # Optional in-process FAISS index (FAISS_INDEX_PATH); rebuilds run one at a time
+        self.vector_index = create_vector_index()
+        self._index_refresh_lock = asyncio.Lock()
+        self._index_refresh_pending = False
     
     def _initialize_client(self):
         """Initialize Supabase client with proper error handling"""
@@ -27,6 +76,106 @@ class DatabaseService:
             # In production, the environment variables should be properly set
             self.supabase = None
     
+    def _initialize_qdrant(self):
+        """Initialize optional Qdrant client used for vector search (Supabase keeps metadata and text)"""
+        qdrant_url = os.getenv("QDRANT_URL")
+        if not qdrant_url:
+            return
+        try:
+            self.qdrant = QdrantClient(url=qdrant_url, api_key=os.getenv("QDRANT_API_KEY"), prefer_grpc=True)
+        except Exception as e:
+            print(f"Warning: Failed to initialize Qdrant client: {e}")
+            self.qdrant = None
+    
+    def _ensure_qdrant_collection(self, dimension: int):
+        """Create the Qdrant collection (cosine, int8 scalar quantization) if it does not exist"""
+        if self._qdrant_collection_ready:
+            return
+        existing = {collection.name for collection in self.qdrant.get_collections().collections}
+        if QDRANT_COLLECTION not in existing:
+            self.qdrant.create_collection(
+                collection_name=QDRANT_COLLECTION,
+                vectors_config=VectorParams(size=dimension, distance=Distance.COSINE),
+                quantization_config=ScalarQuantization(
+                    scalar=ScalarQuantizationConfig(type=ScalarType.INT8, always_ram=True)
+                )
+            )
+        self._qdrant_collection_ready = True
+    
+    def _mirror_to_qdrant(self, embeddings: List[Dict[str, Any]]):
+        """Mirror embeddings into Qdrant, using the chunk id as the point id"""
+        if not self.qdrant or not embeddings:
+            return
+        self._ensure_qdrant_collection(len(embeddings[0]["embedding_vector"]))
+        self.qdrant.upsert(
+            collection_name=QDRANT_COLLECTION,
+            points=[
+                PointStruct(
+                    id=embedding["chunk_id"],
+                    vector=to_list(embedding["embedding_vector"]),
+                    payload={"model_name": embedding["model_name"]}
+                )
+                for embedding in embeddings
+            ]
+        )
+    
+    def start_qdrant_sync(self):
+        """Backfill Qdrant in the background; searches use the Supabase RPC until it completes"""
+        if not self.qdrant or not self.supabase:
+            return
+        if self._qdrant_sync_task and not self._qdrant_sync_task.done():
+            return
+        self._qdrant_search_ready = False
+        self._qdrant_sync_task = asyncio.create_task(self.sync_qdrant())
+    
+    async def sync_qdrant(self):
+        """Copy embeddings stored in Supabase into Qdrant when the collection is missing or behind"""
+        try:
+            self._qdrant_dirty = True
+            while self._qdrant_dirty:
+                self._qdrant_dirty = False
+                stored = await self._execute(
+                    self.supabase.table("embeddings").select("id", count=CountMethod.exact).limit(1)
+                )
+                if await asyncio.to_thread(self._qdrant_point_count) < (stored.count or 0):
+                    rows = await asyncio.to_thread(load_embedding_rows, self.supabase)
+                    await asyncio.to_thread(self._backfill_qdrant, rows)
+                    logger.info(f"Backfilled {len(rows)} embeddings into Qdrant")
+            self._qdrant_search_ready = True
+        except Exception as e:
+            logger.error(f"Qdrant sync failed, searching with Supabase instead: {str(e)}")
+    
+    def _qdrant_point_count(self) -> int:
+        existing = {collection.name for collection in self.qdrant.get_collections().collections}
+        if QDRANT_COLLECTION not in existing:
+            return 0
+        return self.qdrant.count(collection_name=QDRANT_COLLECTION, exact=True).count
+    
+    def _backfill_qdrant(self, rows: List[Any]):
+        for start in range(0, len(rows), QDRANT_BACKFILL_BATCH_SIZE):
+            batch = rows[start:start + QDRANT_BACKFILL_BATCH_SIZE]
+            self._ensure_qdrant_collection(len(batch[0][1]))
+            self.qdrant.upsert(
+                collection_name=QDRANT_COLLECTION,
+                points=[PointStruct(id=chunk_id, vector=vector) for chunk_id, vector in batch]
+            )
+    
+    async def _mirror_embeddings(self, embeddings: List[Dict[str, Any]]):
+        """Mirror new embeddings into Qdrant; a failure falls back to RPC search and a resync, not a failed ingest"""
+        if not self.qdrant:
+            return
+        try:
+            await asyncio.to_thread(self._mirror_to_qdrant, embeddings)
+        except Exception as e:
+            logger.error(f"Failed to mirror embeddings to Qdrant: {str(e)}")
+            self._qdrant_dirty = True
+            self._qdrant_search_ready = False
+            self.start_qdrant_sync()
+    
+    async def _execute(self, query):
+        """Run a supabase-py request off the event loop (the client performs blocking HTTP)"""
+        return await asyncio.to_thread(query.execute)
+    
     # Document operations
     async def create_document(self, title: str, filename: str, file_size: int, content_type: str) -> Dict[str, Any]:
         """Create a new document record"""
@@ -38,34 +187,76 @@ class DatabaseService:
             "filename": filename,
             "file_size": file_size,
             "content_type": content_type,
-            "upload_date": datetime.now().isoformat(),
             "processed": False
         }
         
-        result = self.supabase.table("documents").insert(data).execute()
+        result = await self._execute(self.supabase.table("documents").insert(data))
         return result.data[0] if result.data else None
     
     async def get_document(self, document_id: int) -> Optional[Dict[str, Any]]:
         """Get a document by ID"""
         if not self.supabase:
             raise RuntimeError("Database client not initialized. Check environment variables.")
-        result = self.supabase.table("documents").select("*").eq("id", document_id).execute()
+        result = await self._execute(self.supabase.table("documents").select("*").eq("id", document_id))
         return result.data[0] if result.data else None
     
     async def update_document_processed(self, document_id: int, processed: bool = True):
         """Mark a document as processed"""
         if not self.supabase:
             raise RuntimeError("Database client not initialized. Check environment variables.")
-        result = self.supabase.table("documents").update({"processed": processed}).eq("id", document_id).execute()
+        result = await self._execute(self.supabase.table("documents").update({"processed": processed}).eq("id", document_id))
+        if processed:
+            self._corpus_version_expires = 0.0  # Re-read the version on the next query
+            await self.refresh_vector_index()
         return result.data[0] if result.data else None
 
+    async def refresh_vector_index(self):
+        """Rebuild the in-process FAISS index from stored embeddings (on document add, not per query)"""
+        if not self.vector_index or not self.supabase:
+            return
+        self._index_refresh_pending = True
+        async with self._index_refresh_lock:
+            # A rebuild that started after this request was made already covers it
+            if not self._index_refresh_pending:
+                return
+            self._index_refresh_pending = False
+            rows = await asyncio.to_thread(load_embedding_rows, self.supabase)
+            await asyncio.to_thread(self.vector_index.build, rows)
+
+    async def get_corpus_version(self) -> str:
+        """Fingerprint of the searchable corpus (processed document count and newest id), shared by all workers"""
+        if not self.supabase:
+            raise RuntimeError("Database client not initialized. Check environment variables.")
+        now = time.monotonic()
+        if self._corpus_version is not None and now < self._corpus_version_expires:
+            return self._corpus_version
+        result = await self._execute(
+            self.supabase.table("documents").select("id", count=CountMethod.exact)
+            .eq("processed", True).order("id", desc=True).limit(1)
+        )
+        newest_id = result.data[0]["id"] if result.data else 0
+        self._corpus_version = f"{result.count or 0}:{newest_id}"
+        self._corpus_version_expires = now + CORPUS_VERSION_TTL
+        return self._corpus_version
+    
     async def list_documents(self) -> List[Dict[str, Any]]:
         """List all documents"""
         if not self.supabase:
             raise RuntimeError("Database client not initialized. Check environment variables.")
-        result = self.supabase.table("documents").select("*").order("upload_date", desc=True).execute()
+        result = await self._execute(self.supabase.table("documents").select("*").order("upload_date", desc=True))
         return result.data or []
     
+    async def count_documents(self, processed: Optional[bool] = None) -> int:
+        """Count documents server-side, optionally only those with the given processed flag"""
+        if not self.supabase:
+            raise RuntimeError("Database client not initialized. Check environment variables.")
+        # Exact count comes back in the Content-Range header; at most one row is transferred
+        query = self.supabase.table("documents").select("id", count=CountMethod.exact).limit(1)
+        if processed is not None:
+            query = query.eq("processed", processed)
+        result = await self._execute(query)
+        return result.count or 0
+    
     # Document chunk operations
     async def create_document_chunk(self, document_id: int, chunk_text: str, chunk_index: int, 
                                   page_number: Optional[int] = None, metadata: Optional[Dict] = None) -> Dict[str, Any]:
@@ -77,49 +268,111 @@ class DatabaseService:
             "chunk_text": chunk_text,
             "chunk_index": chunk_index,
             "page_number": page_number,
-            "metadata": metadata,
-            "created_at": datetime.now().isoformat()
+            "metadata": metadata
         }
         
-        result = self.supabase.table("document_chunks").insert(data).execute()
+        result = await self._execute(self.supabase.table("document_chunks").insert(data))
         return result.data[0] if result.data else None
 
+    async def create_document_chunks_bulk(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create many document chunks in a single insert request"""
+        if not self.supabase:
+            raise RuntimeError("Database client not initialized. Check environment variables.")
+        if not chunks:
+            return []
+        data = [
+            {
+                "document_id": chunk["document_id"],
+                "chunk_text": chunk["chunk_text"],
+                "chunk_index": chunk["chunk_index"],
+                "page_number": chunk.get("page_number"),
+                "metadata": chunk.get("metadata")
+            }
+            for chunk in chunks
+        ]
+        
+        result = await self._execute(self.supabase.table("document_chunks").insert(data))
+        return result.data or []
+
     async def get_chunks_by_document(self, document_id: int) -> List[Dict[str, Any]]:
         """Get all chunks for a document"""
         if not self.supabase:
             raise RuntimeError("Database client not initialized. Check environment variables.")
-        result = self.supabase.table("document_chunks").select("*").eq("document_id", document_id).order("chunk_index").execute()
+        result = await self._execute(self.supabase.table("document_chunks").select("*").eq("document_id", document_id).order("chunk_index"))
         return result.data or []
     
     # Embedding operations
-    async def create_embedding(self, chunk_id: int, embedding_vector: List[float], model_name: str) -> Dict[str, Any]:
+    async def create_embedding(self, chunk_id: int, embedding_vector: np.ndarray, model_name: str) -> Dict[str, Any]:
         """Create an embedding for a chunk"""
         if not self.supabase:
             raise RuntimeError("Database client not initialized. Check environment variables.")
+        # Similarity search ranks by inner product, which equals cosine only for unit vectors
+        assert is_normalized(embedding_vector), "embedding_vector must be L2-normalized"
         data = {
             "chunk_id": chunk_id,
-            "embedding_vector": embedding_vector,
-            "model_name": model_name,
-            "created_at": datetime.now().isoformat()
+            "embedding_vector": to_halfvec_text(embedding_vector),
+            "model_name": model_name
         }
         
-        result = self.supabase.table("embeddings").insert(data).execute()
+        result = await self._execute(self.supabase.table("embeddings").insert(data))
+        await self._mirror_embeddings([{**data, "embedding_vector": embedding_vector}])
         return result.data[0] if result.data else None
     
-    async def similarity_search(self, query_embedding: List[float], limit: int = 5) -> List[Dict[str, Any]]:
+    async def create_embeddings_bulk(self, embeddings: List[Dict[str, Any]]) -> int:
+        """Create many embeddings in a single insert request and return how many were stored"""
+        if not self.supabase:
+            raise RuntimeError("Database client not initialized. Check environment variables.")
+        if not embeddings:
+            return 0
+        assert all(is_normalized(embedding["embedding_vector"]) for embedding in embeddings), \
+            "embedding_vector must be L2-normalized"
+        data = [
+            {
+                "chunk_id": embedding["chunk_id"],
+                "embedding_vector": to_halfvec_text(embedding["embedding_vector"]),
+                "model_name": embedding["model_name"]
+            }
+            for embedding in embeddings
+        ]
+        
+        # Nothing is read back, so skip echoing every vector in the response
+        await self._execute(self.supabase.table("embeddings").insert(data, returning=ReturnMethod.minimal))
+        await self._mirror_embeddings(embeddings)
+        return len(data)
+    
+    async def similarity_search(self, query_embedding: np.ndarray, limit: int = 5,
+                                include_embeddings: bool = False) -> List[Dict[str, Any]]:
         """Perform similarity search using vector embeddings"""
+        if self.qdrant and self._qdrant_search_ready:
+            # Qdrant holds a mirror of the vectors; chunk ids map back to Supabase rows
+            try:
+                hits = await asyncio.to_thread(
+                    self.qdrant.search,
+                    collection_name=QDRANT_COLLECTION,
+                    query_vector=to_list(query_embedding),
+                    limit=limit,
+                    score_threshold=0.3
+                )
+                return [{"chunk_id": hit.id, "similarity": hit.score} for hit in hits]
+            except Exception as e:
+                logger.warning(f"Qdrant search failed, falling back to Supabase: {str(e)}")
+        
+        if self.vector_index and self.vector_index.ready:
+            return await asyncio.to_thread(self.vector_index.search, query_embedding, limit, 0.3)
+        
         if not self.supabase:
             raise RuntimeError("Database client not initialized. Check environment variables.")
         # Using Supabase's vector similarity search
         # This requires pgvector extension to be enabled in Supabase
-        rpc_result = self.supabase.rpc(
-            "similarity_search",
+        rpc_result = await self._execute(self.supabase.rpc(
+            "similarity_search_quantized" if VECTOR_SEARCH_QUANTIZED else "similarity_search",
             {
-                "query_embedding": query_embedding,
+                "query_embedding": to_halfvec_text(query_embedding),
                 "match_threshold": 0.3,  # Lower threshold for better recall
-                "match_count": limit
+                "match_count": limit,
+                "include_embedding": include_embeddings
             }
-        ).execute()
+        ))
         
         return rpc_result.data or []
     
@@ -127,11 +380,64 @@ class DatabaseService:
         """Get chunk with associated document information"""
         if not self.supabase:
             raise RuntimeError("Database client not initialized. Check environment variables.")
-        result = self.supabase.table("document_chunks").select(
+        result = await self._execute(self.supabase.table("document_chunks").select(
             "*, documents(*)"
-        ).eq("id", chunk_id).execute()
+        ).eq("id", chunk_id))
         
         return result.data[0] if result.data else None
+    
+    async def get_chunks_with_documents(self, chunk_ids: List[int],
+                                        include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        """Get many chunks with their document information in a single request"""
+        if not self.supabase:
+            raise RuntimeError("Database client not initialized. Check environment variables.")
+        if not chunk_ids:
+            return []
+        result = await self._execute(self.supabase.table("document_chunks").select(
+            "*, documents(*), embeddings(embedding_vector)" if include_embeddings else "*, documents(*)"
+        ).in_("id", chunk_ids))
+        
+        rows = result.data or []
+        if include_embeddings:
+            for row in rows:
+                stored = row.pop("embeddings", None) or [{}]
+                row["embedding"] = _parse_vector(stored[0].get("embedding_vector"))
+        return rows
+    
+    async def similarity_search_with_documents(self, query_embedding: np.ndarray, limit: int = 5,
+                                               include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        """Similarity search returning chunk rows with their document, similarity_score and optional embedding"""
+        search_results = await self.similarity_search(query_embedding, limit, include_embeddings)
+        if not search_results:
+            return []
+        
+        if "chunk_text" in search_results[0]:
+            # The similarity_search RPC already joins chunks with their documents
+            return [
+                {
+                    "id": row["chunk_id"],
+                    "document_id": row["document_id"],
+                    "chunk_text": row["chunk_text"],
+                    "page_number": row["page_number"],
+                    "documents": {
+                        "id": row["document_id"],
+                        "title": row["title"],
+                        "filename": row["filename"]
+                    },
+                    "similarity_score": row.get("similarity", 0.0),
+                    **({"embedding": _parse_vector(row.get("embedding_vector"))} if include_embeddings else {})
+                }
+                for row in search_results
+            ]
+        
+        # Qdrant/FAISS hits only carry chunk ids: fetch them all in one IN query
+        rows = await self.get_chunks_with_documents([row["chunk_id"] for row in search_results], include_embeddings)
+        rows_by_id = {row["id"]: row for row in rows}
+        return [
+            {**rows_by_id[hit["chunk_id"]], "similarity_score": hit.get("similarity", 0.0)}
+            for hit in search_results
+            if hit["chunk_id"] in rows_by_id
+        ]
 
 # Singleton instance
 db_service = DatabaseService() 
\ No newline at end of file
@@ -1,43 +1,120 @@
 import fitz  # PyMuPDF
+import asyncio
+import bisect
+import multiprocessing
+import os
 import re
+from collections import Counter
 from typing import List, Dict, Any, Tuple
 from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Precompiled patterns used on every page / chunk
+_WHITESPACE_RE = re.compile(r'\s+')
+_PAGE_NUMBER_RE = re.compile(r'\n\s*\d+\s*\n')  # Standalone page numbers
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+_LEADING_NUMBER_RE = re.compile(r'^\d+\s')
+_SENTENCE_END_RE = re.compile(r'[.!?](?=\s|$)')
+
+# Common section patterns in economic reports, tried in order
+_SECTION_PATTERNS = (
+    r'\n\s*(?:CHAPTER|Chapter)\s+\d+[:\-\s]',
+    r'\n\s*(?:SECTION|Section)\s+\d+[:\-\s]',
+    r'\n\s*\d+\.\s+[A-Z][A-Za-z\s]{10,50}\n',
+    r'\n\s*[A-Z][A-Z\s]{15,80}\n\s*\n',  # ALL CAPS headers
+    r'\n\s*(?:Executive Summary|Introduction|Methodology|Results|Conclusion|Appendix)',
+)
+# All header styles fused into one alternation so the text is scanned once
+_SECTION_RE = re.compile("|".join(f"(?:{pattern})" for pattern in _SECTION_PATTERNS), re.IGNORECASE)
+
+# Ligature (common OCR issue) and smart quote normalization in a single pass
+_NORMALIZE_TABLE = str.maketrans({
+    '\ufb00': 'ff',
+    '\ufb01': 'fi',
+    '\ufb02': 'fl',
+    '\ufb03': 'ffi',
+    '\ufb04': 'ffl',
+    '\ufb05': 'st',
+    '\ufb06': 'st',
+    '\u201c': '"',
+    '\u201d': '"',
+    '\u201e': '"',
+    '\u2018': "'",
+    '\u2019': "'",
+    '\u201a': "'",
+})
+
+# CPU-bound extraction/chunking runs in worker processes so the event loop stays responsive
+_process_pool = None
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Lazily create the shared process pool (spawned, so no forked event loop state)"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+def shutdown_process_pool():
+    """Shut down the shared process pool (called on application shutdown)"""
+    global _process_pool
+    if _process_pool is not None:
+        # Queued work is cancelled; waiting only lets running tasks finish and the pool close its pipes before exit
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
+
 class DocumentProcessor:
     def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
     
+    async def process_pdf(self, file_content: bytes, filename: str) -> Tuple[str, List[Dict[str, Any]], int]:
+        """Extract, title and chunk a PDF in one worker call, returning (title, chunks, pages processed)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_process_pool(), self._process_sync, file_content, filename)
+    
+    def _process_sync(self, file_content: bytes, filename: str) -> Tuple[str, List[Dict[str, Any]], int]:
+        """Synchronous extract + chunk pipeline (runs in a worker process)"""
+        # The full text and page texts stay in the worker; only the chunks are sent back
+        full_text, pages_data = self._extract_sync(file_content)
+        title = self._title_sync(full_text, filename)
+        chunks = self._chunk_sync(full_text, pages_data)
+        return title, chunks, len(pages_data)
+    
     async def extract_text_from_pdf(self, file_content: bytes) -> Tuple[str, List[Dict[str, Any]]]:
         """Extract text from PDF and return full text plus page-wise metadata"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_process_pool(), self._extract_sync, file_content)
+    
+    def _extract_sync(self, file_content: bytes) -> Tuple[str, List[Dict[str, Any]]]:
+        """Synchronous PDF text extraction (runs in a worker process)"""
         try:
-            # Open PDF from bytes
+            # Open PDF from bytes; pages are read sequentially since PyMuPDF is not thread-safe
             pdf_document = fitz.open(stream=file_content, filetype="pdf")
             
-            full_text = ""
             pages_data = []
+            full_text_parts = []
             
-            for page_num in range(len(pdf_document)):
-                page = pdf_document.load_page(page_num)
-                page_text = page.get_text()
-                
-                # Clean up the text
-                page_text = self._clean_text(page_text)
-                
-                if page_text.strip():  # Only add non-empty pages
-                    pages_data.append({
-                        "page_number": page_num + 1,
-                        "text": page_text,
-                        "char_count": len(page_text)
-                    })
-                    full_text += f"\n\n--- Page {page_num + 1} ---\n\n{page_text}"
-            
-            pdf_document.close()
+            try:
+                for page_num in range(len(pdf_document)):
+                    page_text = self._clean_text(pdf_document.load_page(page_num).get_text())
+                    
+                    if page_text.strip():  # Only add non-empty pages
+                        pages_data.append({
+                            "page_number": page_num + 1,
+                            "text": page_text,
+                            "char_count": len(page_text)
+                        })
+                        full_text_parts.append(f"\n\n--- Page {page_num + 1} ---\n\n{page_text}")
+            finally:
+                pdf_document.close()
             
-            return full_text, pages_data
+            return "".join(full_text_parts), pages_data
             
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {str(e)}")
@@ -46,22 +123,23 @@ class DocumentProcessor:
     def _clean_text(self, text: str) -> str:
         """Clean and normalize extracted text"""
         # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
+        text = _WHITESPACE_RE.sub(' ', text)
         
         # Remove page headers/footers patterns (common in reports)
-        text = re.sub(r'\n\s*\d+\s*\n', '\n', text)  # Remove standalone page numbers
-        
-        # Fix common OCR issues
-        text = text.replace('ﬁ', 'fi').replace('ﬂ', 'fl')
+        text = _PAGE_NUMBER_RE.sub('\n', text)
         
-        # Normalize quotes
-        text = text.replace('"', '"').replace('"', '"')
-        text = text.replace(''', "'").replace(''', "'")
+        # Fix common OCR issues and normalize quotes
+        text = text.translate(_NORMALIZE_TABLE)
         
         return text.strip()
     
     async def create_intelligent_chunks(self, text: str, pages_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Create intelligent chunks that respect document structure"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_process_pool(), self._chunk_sync, text, pages_data)
+    
+    def _chunk_sync(self, text: str, pages_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Synchronous chunking (runs in a worker process)"""
         chunks = []
         
         # First, try to split by sections/headings
@@ -79,11 +157,14 @@ class DocumentProcessor:
             else:
                 final_chunks.append(section)
         
+        # Index page text once per document for page estimation
+        page_index = self._build_page_index(pages_data)
+        
         # Create chunk objects with metadata
         for idx, chunk_text in enumerate(final_chunks):
             if chunk_text.strip():  # Only add non-empty chunks
                 # Determine which page this chunk likely comes from
-                page_number = self._estimate_page_number(chunk_text, pages_data)
+                page_number = self._estimate_page_number(chunk_text, page_index)
                 
                 chunks.append({
                     "chunk_text": chunk_text.strip(),
@@ -100,27 +181,18 @@ class DocumentProcessor:
     
     def _split_by_sections(self, text: str) -> List[str]:
         """Split text by section headers"""
-        # Look for common section patterns in economic reports
-        section_patterns = [
-            r'\n\s*(?:CHAPTER|Chapter)\s+\d+[:\-\s]',
-            r'\n\s*(?:SECTION|Section)\s+\d+[:\-\s]',
-            r'\n\s*\d+\.\s+[A-Z][A-Za-z\s]{10,50}\n',
-            r'\n\s*[A-Z][A-Z\s]{15,80}\n\s*\n',  # ALL CAPS headers
-            r'\n\s*(?:Executive Summary|Introduction|Methodology|Results|Conclusion|Appendix)',
-        ]
-        
-        for pattern in section_patterns:
-            sections = re.split(pattern, text, flags=re.IGNORECASE)
-            if len(sections) > 2:  # Found meaningful sections
-                return [section.strip() for section in sections if section.strip()]
+        sections = _SECTION_RE.split(text)
+        if len(sections) > 2:  # Found meaningful sections
+            return [section.strip() for section in sections if section.strip()]
         
         return [text]  # Return original text if no sections found
     
     def _split_by_paragraphs(self, text: str) -> List[str]:
         """Split text by paragraphs, grouping small ones together"""
-        paragraphs = re.split(r'\n\s*\n', text)
+        paragraphs = _PARAGRAPH_RE.split(text)
         chunks = []
-        current_chunk = ""
+        current_parts = []
+        current_length = 0  # Length of "\n\n".join(current_parts)
         
         for paragraph in paragraphs:
             paragraph = paragraph.strip()
@@ -128,14 +200,16 @@ class DocumentProcessor:
                 continue
             
             # If adding this paragraph would exceed chunk size, start new chunk
-            if len(current_chunk) + len(paragraph) > self.chunk_size and current_chunk:
-                chunks.append(current_chunk)
-                current_chunk = paragraph
+            if current_parts and current_length + len(paragraph) > self.chunk_size:
+                chunks.append("\n\n".join(current_parts))
+                current_parts = [paragraph]
+                current_length = len(paragraph)
             else:
-                current_chunk += "\n\n" + paragraph if current_chunk else paragraph
+                current_length += len(paragraph) + (2 if current_parts else 0)
+                current_parts.append(paragraph)
         
-        if current_chunk:
-            chunks.append(current_chunk)
+        if current_parts:
+            chunks.append("\n\n".join(current_parts))
         
         return chunks
     
@@ -144,15 +218,18 @@ class DocumentProcessor:
         chunks = []
         start = 0
         
+        # Offsets just past each sentence end, computed once for the whole text
+        boundaries = [match.end() for match in _SENTENCE_END_RE.finditer(text)]
+        
         while start < len(text):
             end = start + self.chunk_size
             
             # If this is not the last chunk, try to break at sentence boundary
             if end < len(text):
-                # Look for sentence end within overlap range
-                sentence_end = text.rfind('.', end - self.chunk_overlap, end)
-                if sentence_end > start:
-                    end = sentence_end + 1
+                # Latest sentence end within overlap range
+                idx = bisect.bisect_right(boundaries, end) - 1
+                if idx >= 0 and boundaries[idx] > max(start + 1, end - self.chunk_overlap):
+                    end = boundaries[idx]
             
             chunk = text[start:end].strip()
             if chunk:
@@ -166,35 +243,48 @@ class DocumentProcessor:
         
         return chunks
     
-    def _estimate_page_number(self, chunk_text: str, pages_data: List[Dict[str, Any]]) -> int:
+    def _build_page_index(self, pages_data: List[Dict[str, Any]]) -> Tuple[List[Tuple[int, str]], Dict[str, List[int]]]:
+        """Lowercase page texts once and build a word -> page positions inverted index"""
+        page_texts = [(page_data["page_number"], page_data["text"].lower()) for page_data in pages_data]
+        word_to_pages: Dict[str, List[int]] = {}
+        
+        for position, (_, page_text) in enumerate(page_texts):
+            for word in set(page_text.split()):
+                word_to_pages.setdefault(word, []).append(position)
+        
+        return page_texts, word_to_pages
+    
+    def _estimate_page_number(self, chunk_text: str, page_index: Tuple[List[Tuple[int, str]], Dict[str, List[int]]]) -> int:
         """Estimate which page a chunk comes from by finding best text match"""
-        best_match_page = 1
-        best_match_score = 0
+        page_texts, word_to_pages = page_index
         
         # Take first 100 characters of chunk for matching
         chunk_sample = chunk_text[:100].lower()
         
-        for page_data in pages_data:
-            page_text = page_data["text"].lower()
-            
-            # Simple containment score
-            if chunk_sample in page_text:
-                score = len(chunk_sample)
-            else:
-                # Calculate similarity based on common words
-                chunk_words = set(chunk_sample.split())
-                page_words = set(page_text.split())
-                common_words = chunk_words.intersection(page_words)
-                score = len(common_words)
-            
-            if score > best_match_score:
-                best_match_score = score
-                best_match_page = page_data["page_number"]
+        # Simple containment always outscores word overlap, so the first containing page wins
+        if chunk_sample:
+            for page_number, page_text in page_texts:
+                if chunk_sample in page_text:
+                    return page_number
         
-        return best_match_page
+        # Otherwise score pages by the number of sample words they share
+        scores = Counter()
+        for word in set(chunk_sample.split()):
+            scores.update(word_to_pages.get(word, ()))
+        
+        if not scores:
+            return 1
+        
+        # Highest overlap wins, earliest page on ties
+        best_position = min(scores, key=lambda position: (-scores[position], position))
+        return page_texts[best_position][0]
     
     async def get_document_title(self, text: str, filename: str) -> str:
         """Extract or generate a meaningful title for the document"""
+        return self._title_sync(text, filename)
+    
+    def _title_sync(self, text: str, filename: str) -> str:
+        """Title from the first all-caps heading line, else from the filename"""
         # Try to find title in first few lines
         lines = text.split('\n')[:10]
         
@@ -203,7 +293,7 @@ class DocumentProcessor:
             # Look for title-like patterns
             if (len(line) > 20 and len(line) < 100 and 
                 line.isupper() and 
-                not re.match(r'^\d+\s', line)):
+                not _LEADING_NUMBER_RE.match(line)):
                 return line.title()
         
         # Fall back to filename without extension
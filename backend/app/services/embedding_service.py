@@ -1,10 +1,14 @@
 import os
+import hashlib
 import openai
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 # from sentence_transformers import SentenceTransformer
 import logging
+from ..utils.cache import LRUCache, content_hash_key, create_embedding_store
 
 try:
     import google.generativeai as genai
@@ -12,13 +16,128 @@ try:
 except ImportError:
     GEMINI_AVAILABLE = False
 
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+try:
+    from aiolimiter import AsyncLimiter
+    AIOLIMITER_AVAILABLE = True
+except ImportError:
+    AIOLIMITER_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+def _stable_hash(word: str) -> int:
+    """Process-independent 64-bit word hash (builtin hash() is randomized per process)"""
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_64_intdigest(word)
+    return int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+
+_token_encoding = None
+
+def _get_token_encoding():
+    """Tokenizer used by OpenAI embedding models, loaded once per process"""
+    global _token_encoding
+    if _token_encoding is None and TIKTOKEN_AVAILABLE:
+        try:
+            # May download the BPE file on first use; without it inputs are capped by characters instead
+            _token_encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(f"Failed to load tiktoken encoding, truncating by characters: {str(e)}")
+    return _token_encoding
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True)
+    def _simple_embed_kernel(hashes, dim):
+        """Bucket word hashes into a unit-length bag-of-hashes vector"""
+        embedding = np.zeros(dim, dtype=np.float32)
+        for h in hashes:
+            embedding[h % dim] += 1.0
+        magnitude = 0.0
+        for value in embedding:
+            magnitude += value * value
+        magnitude = magnitude ** 0.5
+        if magnitude > 0:
+            embedding /= magnitude
+        return embedding
+else:
+    def _simple_embed_kernel(hashes, dim):
+        """Bucket word hashes into a unit-length bag-of-hashes vector"""
+        embedding = np.bincount((hashes % dim).astype(np.intp), minlength=int(dim)).astype(np.float32)
+        magnitude = np.linalg.norm(embedding)
+        if magnitude > 0:
+            embedding /= magnitude
+        return embedding
+
+def normalize(embedding: np.ndarray) -> np.ndarray:
+    """Unit-length copy of an embedding (zero vectors stay zero); stored vectors are compared by inner product"""
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+def is_normalized(embedding: np.ndarray) -> bool:
+    """True for unit-length (or zero fallback) embeddings"""
+    norm = np.linalg.norm(embedding)
+    return norm == 0 or abs(norm - 1.0) < 1e-3
+
+def _is_rate_limited(error: Exception) -> bool:
+    """True for HTTP 429 errors from the OpenAI or Google clients"""
+    return isinstance(error, openai.RateLimitError) or getattr(error, "code", None) == 429
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds from a Retry-After response header, when the error carries one"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def to_list(embedding: np.ndarray) -> List[float]:
+    """JSON-serializable form of an embedding, for the database/API boundary"""
+    return embedding.tolist() if isinstance(embedding, np.ndarray) else list(embedding)
+
+def to_halfvec_text(embedding: np.ndarray) -> str:
+    """pgvector text form of an embedding stored as halfvec"""
+    # 5 significant digits round-trip every float16 value, at about half the bytes of full float repr
+    return "[" + ",".join(map("{:.5g}".format, to_list(embedding))) + "]"
+
 class EmbeddingService:
+    # OpenAI rejects embedding requests with more inputs than this
+    MAX_BATCH_SIZE = 2048
+    # Per-input token limit of OpenAI embedding models
+    OPENAI_MAX_INPUT_TOKENS = 8191
+    # Attempts for a rate-limited (HTTP 429) provider call before giving up
+    RATE_LIMIT_RETRIES = 5
+    
     def __init__(self):
         self.gemini_client = None
         self.openai_client = None
         self.local_model = None
+        self._token_encoding = None
+        # Content-hash cache (in-memory LRU + optional sqlite sidecar) checked before any provider call
+        self._embedding_cache = LRUCache(maxsize=int(os.getenv("EMBEDDING_CACHE_SIZE", "50000")))
+        self._embedding_store = create_embedding_store()
+        self._inflight: Dict[bytes, "asyncio.Future[np.ndarray]"] = {}
+        # Caps concurrent Gemini requests (replaces the fixed per-call sleep for rate limiting)
+        self._gemini_semaphore = asyncio.Semaphore(int(os.getenv("GEMINI_EMBEDDING_CONCURRENCY", "8")))
+        self._openai_semaphore = asyncio.Semaphore(5)
+        # Dedicated pool for blocking provider calls, separate from the loop's default executor
+        self._io_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="embed")
         
         # Try to initialize Gemini first (free tier available)
         if GEMINI_AVAILABLE and self._initialize_gemini():
@@ -28,12 +147,29 @@ class EmbeddingService:
         elif self._initialize_openai():
             self.embedding_model = "text-embedding-3-small"
             self.embedding_dim = 1536
+            self._token_encoding = _get_token_encoding()
             logger.info("Using OpenAI embeddings")
         else:
             # Fallback to simple word-based embeddings
             self.embedding_model = "simple-word-embeddings"
             self.embedding_dim = 384
             logger.info("Using simple word-based embeddings (fallback)")
+        
+        # Shared zero vector for blank inputs and failed embeddings; read-only since every caller gets the same array
+        self._zero_vec = np.zeros(self.embedding_dim, dtype=np.float32)
+        self._zero_vec.flags.writeable = False
+        
+        # Remote providers are throttled to their documented request rate; the local fallback never is
+        self._rate_limiter = self._create_rate_limiter()
+    
+    def _create_rate_limiter(self) -> Optional["AsyncLimiter"]:
+        """Requests-per-minute limiter for the active provider (EMBEDDING_REQUESTS_PER_MINUTE)"""
+        requests_per_minute = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "0"))
+        if requests_per_minute <= 0 or not AIOLIMITER_AVAILABLE:
+            return None
+        if not (self.gemini_client or self.openai_client):
+            return None
+        return AsyncLimiter(requests_per_minute, 60)
     
     def _initialize_gemini(self) -> bool:
         """Initialize Google Gemini API"""
@@ -57,50 +193,133 @@ class EmbeddingService:
         try:
             api_key = os.getenv("OPENAI_API_KEY")
             if api_key:
-                self.openai_client = openai.OpenAI(api_key=api_key)
+                self.openai_client = openai.AsyncOpenAI(api_key=api_key)
                 return True
             return False
         except Exception as e:
             logger.warning(f"Failed to initialize OpenAI: {str(e)}")
             return False
     
-    async def generate_embedding(self, text: str) -> List[float]:
+    def _cache_key(self, text: str, task_type: str = "retrieval_document") -> bytes:
+        return content_hash_key(text, self.embedding_model, task_type)
+    
+    def _get_cached_embedding(self, key: bytes) -> Optional[np.ndarray]:
+        embedding = self._embedding_cache.get(key)
+        if embedding is None and self._embedding_store:
+            embedding = self._embedding_store.get(key)
+            if embedding is not None:
+                self._embedding_cache.set(key, embedding)
+        return embedding
+    
+    def _cache_embedding(self, key: bytes, embedding: np.ndarray):
+        if not np.any(embedding):  # Never cache zero-vector fallbacks
+            return
+        self._embedding_cache.set(key, embedding)
+        if self._embedding_store:
+            self._embedding_store.set(key, embedding)
+    
+    async def generate_embedding(self, text: str) -> np.ndarray:
         """Generate embedding for a single text"""
+        processed_text = self._preprocess_text(text) if isinstance(text, str) else ""
+        if not processed_text:
+            return self._zero_vec  # Nothing to embed; skip the provider round trip
+        
+        key = self._cache_key(processed_text)
+        cached = self._get_cached_embedding(key)
+        if cached is not None:
+            return cached
+        
+        # Concurrent requests for the same text share one provider call
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._generate_uncached_embedding(processed_text, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so one caller's cancellation doesn't cancel the call for the others
+        return await asyncio.shield(task)
+    
+    async def _generate_uncached_embedding(self, text: str, key: bytes) -> np.ndarray:
+        """Embed already-preprocessed text with the active provider and cache the result"""
         if self.gemini_client:
-            return await self._generate_gemini_embedding(text)
+            embedding = await self._generate_gemini_embedding(text)
         elif self.openai_client:
-            return await self._generate_openai_embedding(text)
+            embedding = await self._generate_openai_embedding(text)
         else:
-            return await self._generate_simple_embedding(text)
+            embedding = await self._generate_simple_embedding(text)
+        self._cache_embedding(key, embedding)
+        return embedding
     
-    async def generate_batch_embeddings(self, texts: List[str]) -> List[List[float]]:
+    async def generate_batch_embeddings(self, texts: List[str]) -> List[np.ndarray]:
         """Generate embeddings for multiple texts"""
+        texts = [text if isinstance(text, str) else "" for text in texts]
+        processed_texts = [self._preprocess_text(text) for text in texts]
+        keys = [self._cache_key(text) for text in processed_texts]
+        # Blank texts get the zero vector without a cache lookup or provider call
+        embeddings = [
+            self._get_cached_embedding(key) if text else self._zero_vec
+            for text, key in zip(processed_texts, keys)
+        ]
+        
+        # Embed each distinct uncached text once (repeated headers/footers are common in chunks)
+        misses: Dict[bytes, List[int]] = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                misses.setdefault(keys[i], []).append(i)
+        if not misses:
+            return embeddings
+        
+        miss_texts = [processed_texts[positions[0]] for positions in misses.values()]
         if self.gemini_client:
-            return await self._generate_gemini_batch_embeddings(texts)
+            generated = await self._generate_gemini_batch_embeddings(miss_texts)
         elif self.openai_client:
-            return await self._generate_openai_batch_embeddings(texts)
+            generated = await self._generate_openai_batch_embeddings(miss_texts)
         else:
-            return await self._generate_simple_batch_embeddings(texts)
+            generated = await self._generate_simple_batch_embeddings(miss_texts)
+        
+        for (key, positions), embedding in zip(misses.items(), generated):
+            self._cache_embedding(key, embedding)
+            for i in positions:
+                embeddings[i] = embedding
+        return embeddings
+    
+    def max_batch_size(self) -> int:
+        """Texts per generate_batch_embeddings call that suit the active provider"""
+        if self.gemini_client:
+            return 100  # One request per text, bounded by the Gemini semaphore
+        return 256
+    
+    async def _with_rate_limit_retry(self, call, *args, **kwargs):
+        """Await a provider call within the request budget, backing off on HTTP 429 (honouring Retry-After when given)"""
+        delay = 1.0
+        for attempt in range(self.RATE_LIMIT_RETRIES):
+            try:
+                if self._rate_limiter:
+                    await self._rate_limiter.acquire()
+                return await call(*args, **kwargs)
+            except Exception as e:
+                if not _is_rate_limited(e) or attempt == self.RATE_LIMIT_RETRIES - 1:
+                    raise
+                wait = _retry_after(e) or delay
+                logger.warning(f"Embedding provider rate limited, retrying in {wait:.1f}s")
+                await asyncio.sleep(wait)
+                delay *= 2
     
-    async def _generate_gemini_embedding(self, text: str) -> List[float]:
-        """Generate embedding using Google Gemini API"""
+    async def _generate_gemini_embedding(self, text: str) -> np.ndarray:
+        """Generate embedding using Google Gemini API (text is already preprocessed)"""
         try:
-            # Clean and truncate text if too long
-            text = self._preprocess_text(text)
-            
             # Run in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            
-            def _generate_sync():
-                result = genai.embed_content(
-                    model=self.embedding_model,
-                    content=text,
-                    task_type="retrieval_document"
-                )
-                return result['embedding']
+            loop = asyncio.get_running_loop()
+            request = functools.partial(
+                genai.embed_content,
+                model=self.embedding_model,
+                content=text,
+                task_type="retrieval_document"
+            )
             
-            embedding = await loop.run_in_executor(None, _generate_sync)
-            return embedding
+            # Bound executor submissions so bursts can't flood the thread pool
+            async with self._gemini_semaphore:
+                result = await self._with_rate_limit_retry(loop.run_in_executor, self._io_pool, request)
+            return np.asarray(result['embedding'], dtype=np.float32)
             
         except Exception as e:
             logger.error(f"Error generating Gemini embedding: {str(e)}")
@@ -109,107 +328,87 @@ class EmbeddingService:
                 return await self._generate_openai_embedding(text)
             raise Exception(f"Failed to generate embedding: {str(e)}")
     
-    async def _generate_gemini_batch_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate batch embeddings using Google Gemini API"""
-        try:
-            # Preprocess all texts
-            processed_texts = [self._preprocess_text(text) for text in texts]
-            
-            # Gemini API doesn't have native batch support, so process individually
-            embeddings = []
-            for text in processed_texts:
-                try:
-                    embedding = await self._generate_gemini_embedding(text)
-                    embeddings.append(embedding)
-                    # Small delay to respect rate limits
-                    await asyncio.sleep(0.1)
-                except Exception as e:
-                    logger.error(f"Error generating embedding for text: {str(e)}")
-                    # Use zero vector as fallback
-                    embeddings.append([0.0] * self.embedding_dim)
-            
-            return embeddings
-            
-        except Exception as e:
-            logger.error(f"Error generating Gemini batch embeddings: {str(e)}")
-            # Fallback to individual processing
-            embeddings = []
-            for text in texts:
-                try:
-                    embedding = await self._generate_gemini_embedding(text)
-                    embeddings.append(embedding)
-                except:
-                    # Use zero vector as fallback
-                    embeddings.append([0.0] * self.embedding_dim)
-            return embeddings
-
-    async def _generate_openai_embedding(self, text: str) -> List[float]:
-        """Generate embedding using OpenAI API"""
+    async def _generate_gemini_batch_embeddings(self, texts: List[str]) -> List[np.ndarray]:
+        """Generate batch embeddings using Google Gemini API (texts are already preprocessed)"""
+        # Gemini API doesn't have native batch support; concurrency is capped in _generate_gemini_embedding
+        results = await asyncio.gather(
+            *(self._generate_gemini_embedding(text) for text in texts),
+            return_exceptions=True
+        )
+        return self._zero_failed(results)
+    
+    def _zero_failed(self, results: List[Any]) -> List[np.ndarray]:
+        """Replace failed per-text results from gather(return_exceptions=True) with the zero vector"""
+        embeddings = []
+        for result in results:
+            # CancelledError is a BaseException, not an Exception; propagate it rather than treat it as a vector
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, Exception):
+                logger.error(f"Error generating embedding for text: {str(result)}")
+                result = self._zero_vec
+            embeddings.append(result)
+        return embeddings
+    
+    async def _generate_openai_embedding(self, text: str) -> np.ndarray:
+        """Generate embedding using OpenAI API (text is already preprocessed)"""
         try:
-            # Clean and truncate text if too long
-            text = self._preprocess_text(text)
-            
-            response = self.openai_client.embeddings.create(
-                input=text,
-                model=self.embedding_model
-            )
+            async with self._openai_semaphore:
+                response = await self._with_rate_limit_retry(
+                    self.openai_client.embeddings.create,
+                    input=text,
+                    model=self.embedding_model
+                )
             
-            return response.data[0].embedding
+            return np.asarray(response.data[0].embedding, dtype=np.float32)
         except Exception as e:
             logger.error(f"Error generating OpenAI embedding: {str(e)}")
             raise Exception(f"Failed to generate embedding: {str(e)}")
     
-    async def _generate_openai_batch_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate batch embeddings using OpenAI API"""
+    async def _generate_openai_batch_embeddings(self, texts: List[str]) -> List[np.ndarray]:
+        """Generate batch embeddings using OpenAI API (texts are already preprocessed)"""
+        # OpenAI supports batch processing up to MAX_BATCH_SIZE inputs per request
+        sub_batches = [
+            texts[i:i + self.MAX_BATCH_SIZE]
+            for i in range(0, len(texts), self.MAX_BATCH_SIZE)
+        ]
+        results = await asyncio.gather(*(self._generate_openai_sub_batch(batch) for batch in sub_batches))
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+    
+    async def _generate_openai_sub_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed one request-sized batch, falling back to per-text calls if it fails"""
         try:
-            # Preprocess all texts
-            processed_texts = [self._preprocess_text(text) for text in texts]
-            
-            # OpenAI supports batch processing
-            response = self.openai_client.embeddings.create(
-                input=processed_texts,
-                model=self.embedding_model
-            )
+            async with self._openai_semaphore:
+                response = await self._with_rate_limit_retry(
+                    self.openai_client.embeddings.create,
+                    input=texts,
+                    model=self.embedding_model
+                )
             
-            return [item.embedding for item in response.data]
+            return [np.asarray(item.embedding, dtype=np.float32) for item in response.data]
         except Exception as e:
             logger.error(f"Error generating OpenAI batch embeddings: {str(e)}")
             # Fallback to individual processing if batch fails
-            embeddings = []
-            for text in texts:
-                try:
-                    embedding = await self._generate_openai_embedding(text)
-                    embeddings.append(embedding)
-                except:
-                    # Use zero vector as fallback
-                    embeddings.append([0.0] * self.embedding_dim)
-            return embeddings
+            results = await asyncio.gather(
+                *(self._generate_openai_embedding(text) for text in texts),
+                return_exceptions=True
+            )
+            return self._zero_failed(results)
     
-    async def _generate_simple_embedding(self, text: str) -> List[float]:
-        """Generate simple word-based embedding as fallback"""
+    async def _generate_simple_embedding(self, text: str) -> np.ndarray:
+        """Generate simple word-based embedding as fallback (text is already preprocessed)"""
         try:
-            text = self._preprocess_text(text)
-            
             # Simple hash-based embedding as absolute fallback
-            words = text.lower().split()
-            embedding = [0.0] * self.embedding_dim
-            
-            for i, word in enumerate(words[:100]):  # Limit to 100 words
-                hash_val = hash(word) % self.embedding_dim
-                embedding[hash_val] += 1.0
-            
-            # Normalize
-            magnitude = sum(x*x for x in embedding) ** 0.5
-            if magnitude > 0:
-                embedding = [x/magnitude for x in embedding]
-            
-            return embedding
+            words = text.lower().split()[:100]  # Limit to 100 words
+            hashes = np.fromiter((_stable_hash(word) for word in words), dtype=np.uint64, count=len(words))
+            # dim as uint64 keeps the modulo in unsigned integer arithmetic
+            return _simple_embed_kernel(hashes, np.uint64(self.embedding_dim))
             
         except Exception as e:
             logger.error(f"Error generating simple embedding: {str(e)}")
-            return [0.0] * self.embedding_dim
+            return self._zero_vec
     
-    async def _generate_simple_batch_embeddings(self, texts: List[str]) -> List[List[float]]:
+    async def _generate_simple_batch_embeddings(self, texts: List[str]) -> List[np.ndarray]:
         """Generate batch simple embeddings"""
         embeddings = []
         for text in texts:
@@ -218,58 +417,60 @@ class EmbeddingService:
         return embeddings
     
     def _preprocess_text(self, text: str) -> str:
-        """Preprocess text before generating embeddings"""
-        if not text or not isinstance(text, str):
-            return ""
+        """Preprocess text before generating embeddings (callers pass str; public entry points validate)"""
+        if self._token_encoding is not None:
+            # OpenAI limits are in tokens; truncate exactly instead of guessing from characters
+            text = ' '.join(text.split())
+            if len(text) * 4 > self.OPENAI_MAX_INPUT_TOKENS:  # Token count never exceeds UTF-8 bytes
+                tokens = self._token_encoding.encode(text, disallowed_special=())
+                if len(tokens) > self.OPENAI_MAX_INPUT_TOKENS:
+                    text = self._token_encoding.decode(tokens[:self.OPENAI_MAX_INPUT_TOKENS])
+            return text
         
-        # Clean and limit text length
-        text = text.strip()
-        
-        # Limit to reasonable length for API calls (8000 chars for Gemini)
-        if len(text) > 8000:
-            text = text[:8000]
-        
-        # Remove excessive whitespace
-        import re
-        text = re.sub(r'\s+', ' ', text)
-        
-        return text
+        # Limit to reasonable length for API calls (8000 chars for Gemini) before
+        # collapsing whitespace, so huge inputs are never copied in full
+        return ' '.join(text.lstrip()[:8000].split())
     
-    def calculate_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
+    def calculate_similarity(self, embedding1: np.ndarray, embedding2: np.ndarray) -> float:
         """Calculate cosine similarity between two embeddings"""
         try:
-            # Convert to numpy arrays for calculation
-            vec1 = np.array(embedding1)
-            vec2 = np.array(embedding2)
-            
-            # Calculate cosine similarity
-            dot_product = np.dot(vec1, vec2)
-            magnitude1 = np.linalg.norm(vec1)
-            magnitude2 = np.linalg.norm(vec2)
-            
-            if magnitude1 == 0 or magnitude2 == 0:
+            magnitudes = np.linalg.norm(embedding1) * np.linalg.norm(embedding2)
+            if magnitudes == 0:
                 return 0.0
             
-            similarity = dot_product / (magnitude1 * magnitude2)
-            return float(similarity)
+            return float(np.dot(embedding1, embedding2) / magnitudes)
         
         except Exception as e:
             logger.error(f"Error calculating similarity: {str(e)}")
             return 0.0
     
-    async def generate_query_embedding(self, query: str) -> List[float]:
+    def calculate_similarities(self, query: np.ndarray, corpus: np.ndarray) -> np.ndarray:
+        """Cosine similarity of one query against every row of a corpus matrix"""
+        query = np.asarray(query, dtype=np.float32)
+        corpus = np.array(corpus, dtype=np.float32)  # Copy so the caller's matrix is untouched
+        
+        norms = np.linalg.norm(corpus, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        corpus /= norms
+        
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return np.zeros(len(corpus), dtype=np.float32)
+        return corpus @ (query / query_norm)
+    
+    async def generate_query_embedding(self, query: str) -> np.ndarray:
         """Generate embedding specifically for search queries"""
         try:
-            # Use the same embedding generation method
+            # Use the same embedding generation method (and its content-hash cache)
             return await self.generate_embedding(query)
         except Exception as e:
             logger.error(f"Error generating query embedding: {str(e)}")
-            def _generate_sync():
-                # Simplified fallback for queries
-                return [0.0] * self.embedding_dim
-            
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, _generate_sync)
+            # Simplified fallback for queries
+            return self._zero_vec
+    
+    async def aclose(self):
+        """Release the provider thread pool"""
+        self._io_pool.shutdown(wait=False)
     
     def get_model_info(self) -> Dict[str, Any]:
         """Get information about the current embedding model"""
@@ -1,10 +1,15 @@
 import os
+import re
 import openai
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 import logging
-import asyncio
+from operator import itemgetter
+import orjson
+import numpy as np
 from .database import db_service
-from .embedding_service import embedding_service
+from .embedding_service import embedding_service, normalize
+from ..utils.cache import LRUCache, SemanticCache, create_redis_client, query_cache_key
+from ..utils.rerank import mmr
 
 try:
     import google.generativeai as genai
@@ -14,14 +19,59 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Seconds a cached response is kept in Redis
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+
+GEMINI_LLM_MODEL = "gemini-2.0-flash-exp"
+
+# MMR re-ranking: retrieve max_results * factor candidates and keep a diverse max_results
+# (1 disables re-ranking); lambda trades relevance (1.0) against diversity (0.0)
+MMR_CANDIDATE_FACTOR = int(os.getenv("MMR_CANDIDATE_FACTOR", "3"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+
+# Prompt pieces are fixed strings so every request shares a byte-identical prefix
+# (system instruction, then context framing); only the context and question vary
+SYSTEM_INSTRUCTION = """You are an expert AI assistant specializing in economic research and business insights for Alberta, Canada. You help users understand economic data, trends, and business conditions based on research reports.
+
+Your responses should be:
+- Accurate and based solely on the provided context
+- Well-structured and easy to understand
+- Professional but accessible
+- Focused on actionable insights when possible
+- Clear about limitations if information is incomplete
+
+If the context doesn't contain enough information to answer the question, say so clearly."""
+
+CONTEXT_HEADER = "Context from economic research documents:"
+
+ANSWER_INSTRUCTIONS = "Please provide a comprehensive answer based on the context above. If specific data or statistics are mentioned, include them in your response. If the context doesn't fully address the question, clearly state what information is missing."
+
+# "[Source N: title, Page P]" headers written by _format_context
+_SOURCE_HEADER_RE = re.compile(r'\n*\[Source \d+:[^\]\n]*\]\n')
+
+NO_RESULTS_ANSWER = "I couldn't find any relevant information to answer your question. This might be because the documents haven't been processed yet or your query doesn't match the available content."
+
+ERROR_ANSWER = "I encountered an error while processing your question. Please try again or rephrase your question."
+
 class RAGService:
     def __init__(self):
         self.gemini_client = None
         self.openai_client = None
         
+        # Response cache: in-process LRU, plus Redis shared across workers when REDIS_URL is set
+        self._response_cache = LRUCache(maxsize=4096, ttl=RESPONSE_CACHE_TTL)
+        self.redis = create_redis_client()
+        # Paraphrased queries: reuse a response whose query embedding is nearly identical
+        self._semantic_cache = SemanticCache(
+            maxsize=500,
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.97")),
+            ttl=RESPONSE_CACHE_TTL
+        )
+        self._corpus_version: Optional[str] = None
+        
         # Try to initialize Gemini first (free!)
         if GEMINI_AVAILABLE and self._initialize_gemini():
-            self.llm_model = "gemini-2.0-flash-exp"
+            self.llm_model = GEMINI_LLM_MODEL
             logger.info("Using Gemini 2.0 Flash (free)")
         elif self._initialize_openai():
             self.llm_model = "gpt-4o-mini"
@@ -39,6 +89,18 @@ class RAGService:
             
             # Initialize the Gemini API
             genai.configure(api_key=api_key)
+            
+            # Model and generation config are built once and reused for every query
+            self._gemini_model = genai.GenerativeModel(
+                model_name=GEMINI_LLM_MODEL,
+                system_instruction=SYSTEM_INSTRUCTION
+            )
+            self._gemini_generation_config = genai.types.GenerationConfig(
+                temperature=0.3,  # Lower temperature for more factual responses
+                max_output_tokens=1000,
+                top_p=0.8,
+                top_k=40
+            )
             self.gemini_client = True
             return True
         except Exception as e:
@@ -50,7 +112,7 @@ class RAGService:
         try:
             api_key = os.getenv("OPENAI_API_KEY")
             if api_key:
-                self.openai_client = openai.OpenAI(api_key=api_key)
+                self.openai_client = openai.AsyncOpenAI(api_key=api_key)
                 return True
             return False
         except Exception as e:
@@ -60,200 +122,287 @@ class RAGService:
     async def process_query(self, query: str, max_results: int = 5) -> Dict[str, Any]:
         """Main RAG pipeline: process query and return answer with sources"""
         try:
+            # Cached responses are only valid for the corpus they were generated from
+            corpus_version = await self._check_corpus_version()
+            use_cache = corpus_version is not None
+            if use_cache:
+                cache_key = query_cache_key(query, max_results, corpus_version)
+                cached = await self._get_cached_response(cache_key)
+                if cached is not None:
+                    return cached
+            
             # Step 1: Generate query embedding
-            query_embedding = await embedding_service.generate_query_embedding(query)
+            query_embedding = normalize(await embedding_service.generate_query_embedding(query))
+            
+            if use_cache:
+                cached = self._semantic_cache.get(query_embedding, (max_results, corpus_version))
+                if cached is not None:
+                    return cached
             
             # Step 2: Retrieve relevant context
             relevant_chunks = await self._retrieve_relevant_chunks(query_embedding, max_results)
             
             if not relevant_chunks:
                 return {
-                    "answer": "I couldn't find any relevant information to answer your question. This might be because the documents haven't been processed yet or your query doesn't match the available content.",
+                    "answer": NO_RESULTS_ANSWER,
                     "sources": [],
                     "confidence": 0.0
                 }
             
             # Step 3: Format context for LLM
-            context = await self._format_context(relevant_chunks)
+            context = self._format_context(relevant_chunks)
             
-            # Step 4: Generate answer using LLM
-            answer = await self._generate_answer(query, context)
+            # Step 4: Format sources
+            sources = self._format_sources(relevant_chunks)
             
-            # Step 5: Format sources
-            sources = await self._format_sources(relevant_chunks)
+            # Step 5: Generate answer using LLM
+            answer, generated = await self._generate_answer(query, context)
             
-            # Step 6: Calculate confidence score
+            # Step 6: Calculate confidence score (only needs the answer length)
             confidence = self._calculate_confidence(relevant_chunks, answer)
             
-            return {
+            result = {
                 "answer": answer,
                 "sources": sources,
                 "confidence": confidence
             }
+            # Extractive fallbacks (LLM unavailable or failing) are not cached, so the next request retries the LLM
+            if generated and use_cache:
+                await self._cache_response(cache_key, result)
+                self._semantic_cache.set(query_embedding, result, (max_results, corpus_version))
+            return result
             
         except Exception as e:
             logger.error(f"Error processing query: {str(e)}")
             return {
-                "answer": "I encountered an error while processing your question. Please try again or rephrase your question.",
+                "answer": ERROR_ANSWER,
                 "sources": [],
                 "confidence": 0.0
             }
     
-    async def _retrieve_relevant_chunks(self, query_embedding: List[float], max_results: int) -> List[Dict[str, Any]]:
-        """Retrieve relevant document chunks using vector similarity"""
+    async def stream_query(self, query: str, max_results: int = 5) -> AsyncIterator[Dict[str, Any]]:
+        """RAG pipeline that yields sources first, then answer tokens, then the confidence score"""
         try:
-            # Use database service to perform similarity search
-            search_results = await db_service.similarity_search(query_embedding, max_results)
+            corpus_version = await self._check_corpus_version()
+            use_cache = corpus_version is not None
+            cached = None
+            if use_cache:
+                cache_key = query_cache_key(query, max_results, corpus_version)
+                cached = await self._get_cached_response(cache_key)
+            if cached is None:
+                query_embedding = normalize(await embedding_service.generate_query_embedding(query))
+                if use_cache:
+                    cached = self._semantic_cache.get(query_embedding, (max_results, corpus_version))
+            if cached is not None:
+                yield {"type": "sources", "sources": cached["sources"]}
+                yield {"type": "token", "text": cached["answer"]}
+                yield {"type": "done", "confidence": cached["confidence"]}
+                return
+            
+            relevant_chunks = await self._retrieve_relevant_chunks(query_embedding, max_results)
+            if not relevant_chunks:
+                yield {"type": "sources", "sources": []}
+                yield {"type": "token", "text": NO_RESULTS_ANSWER}
+                yield {"type": "done", "confidence": 0.0}
+                return
             
-            # Enrich results with document information
-            enriched_results = []
-            for result in search_results:
-                # Get chunk with document info
-                chunk_with_doc = await db_service.get_chunk_with_document(result.get('chunk_id'))
-                
-                if chunk_with_doc:
-                    enriched_results.append({
-                        **chunk_with_doc,
-                        'similarity_score': result.get('similarity', 0.0)
-                    })
+            context = self._format_context(relevant_chunks)
+            sources = self._format_sources(relevant_chunks)
+            yield {"type": "sources", "sources": sources}
             
-            return enriched_results
+            answer_parts = []
+            generated = True
+            async for text, from_llm in self._stream_answer(query, context):
+                answer_parts.append(text)
+                generated = generated and from_llm
+                yield {"type": "token", "text": text}
+            
+            answer = "".join(answer_parts).strip()
+            confidence = self._calculate_confidence(relevant_chunks, answer)
+            yield {"type": "done", "confidence": confidence}
+            
+            result = {
+                "answer": answer,
+                "sources": sources,
+                "confidence": confidence
+            }
+            if generated and use_cache:
+                await self._cache_response(cache_key, result)
+                self._semantic_cache.set(query_embedding, result, (max_results, corpus_version))
             
         except Exception as e:
-            logger.error(f"Error retrieving relevant chunks: {str(e)}")
-            return []
+            logger.error(f"Error streaming query: {str(e)}")
+            yield {"type": "error", "detail": ERROR_ANSWER}
     
-    async def _format_context(self, chunks: List[Dict[str, Any]]) -> str:
-        """Format retrieved chunks into context for the LLM"""
-        if not chunks:
-            return ""
+    async def _check_corpus_version(self) -> Optional[str]:
+        """Current corpus version (None if it can't be read); in-process entries for older versions are dropped to free memory"""
+        try:
+            corpus_version = await db_service.get_corpus_version()
+        except Exception as e:
+            # Without a version, cached answers can't be validated; the caller skips the caches for this request
+            logger.warning(f"Corpus version lookup failed, bypassing response caches: {str(e)}")
+            return None
+        if self._corpus_version != corpus_version:
+            self._response_cache.clear()
+            self._semantic_cache.clear()
+            self._corpus_version = corpus_version
+        return corpus_version
+    
+    async def _get_cached_response(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached response in the local LRU, then Redis"""
+        cached = self._response_cache.get(cache_key)
+        if cached is not None or not self.redis:
+            return cached
         
-        context_parts = []
+        try:
+            payload = await self.redis.get(f"rag:response:{cache_key}")
+        except Exception as e:
+            logger.warning(f"Redis lookup failed: {str(e)}")
+            return None
         
-        for i, chunk in enumerate(chunks, 1):
-            document = chunk.get('documents', {})
-            doc_title = document.get('title', 'Unknown Document')
-            page_num = chunk.get('page_number', 'Unknown')
-            chunk_text = chunk.get('chunk_text', '')
+        if payload is None:
+            return None
+        cached = orjson.loads(payload)
+        self._response_cache.set(cache_key, cached)
+        return cached
+    
+    async def _cache_response(self, cache_key: str, result: Dict[str, Any]):
+        """Store a response in the local LRU and Redis"""
+        self._response_cache.set(cache_key, result)
+        if not self.redis:
+            return
+        
+        try:
+            await self.redis.setex(f"rag:response:{cache_key}", RESPONSE_CACHE_TTL, orjson.dumps(result))
+        except Exception as e:
+            logger.warning(f"Redis write failed: {str(e)}")
+    
+    async def _retrieve_relevant_chunks(self, query_embedding: np.ndarray, max_results: int) -> List[Dict[str, Any]]:
+        """Retrieve relevant document chunks using vector similarity"""
+        try:
+            # One round trip: search results come back joined with their documents
+            rerank = MMR_CANDIDATE_FACTOR > 1
+            chunks = await db_service.similarity_search_with_documents(
+                query_embedding, max_results * MMR_CANDIDATE_FACTOR if rerank else max_results, rerank
+            )
+            return self._rerank_chunks(query_embedding, chunks, max_results) if rerank else chunks
             
-            context_part = f"""
-[Source {i}: {doc_title}, Page {page_num}]
-{chunk_text}
-"""
-            context_parts.append(context_part.strip())
+        except Exception as e:
+            logger.error(f"Error retrieving relevant chunks: {str(e)}")
+            return []
+    
+    def _rerank_chunks(self, query_embedding: np.ndarray, chunks: List[Dict[str, Any]], max_results: int) -> List[Dict[str, Any]]:
+        """Drop near-duplicate passages with MMR so the context covers more ground"""
+        embeddings = [chunk.pop('embedding', None) for chunk in chunks]
+        if len(chunks) <= max_results or any(embedding is None for embedding in embeddings):
+            return chunks[:max_results]
         
-        return "\n\n".join(context_parts)
+        selected = mmr(query_embedding, np.stack(embeddings), MMR_LAMBDA, max_results)
+        return [chunks[i] for i in selected]
+    
+    def _format_context(self, chunks: List[Dict[str, Any]]) -> str:
+        """Format retrieved chunks into context for the LLM"""
+        return "\n\n".join(
+            f"[Source {i}: {(chunk.get('documents') or {}).get('title', 'Unknown Document')}, "
+            f"Page {chunk.get('page_number', 'Unknown')}]\n{chunk.get('chunk_text', '')}"
+            for i, chunk in enumerate(chunks, 1)
+        )
     
-    async def _generate_answer(self, query: str, context: str) -> str:
-        """Generate answer using LLM with the provided context"""
+    async def _generate_answer(self, query: str, context: str) -> Tuple[str, bool]:
+        """Generate answer using LLM with the provided context; the flag is False for the extractive fallback"""
         if self.gemini_client:
-            return await self._generate_gemini_answer(query, context)
-        elif self.openai_client:
-            return await self._generate_openai_answer(query, context)
-        else:
-            return self._generate_fallback_answer(context)
+            try:
+                return await self._generate_gemini_answer(query, context), True
+            except Exception as e:
+                logger.error(f"Error generating Gemini answer: {str(e)}")
+        
+        # OpenAI is the fallback when Gemini is not configured or fails
+        if self.openai_client:
+            try:
+                return await self._generate_openai_answer(query, context), True
+            except Exception as e:
+                logger.error(f"Error generating OpenAI answer: {str(e)}")
+        
+        return self._generate_fallback_answer(context), False
+    
+    def _gemini_prompt(self, query: str, context: str) -> List[str]:
+        """Stable prefix first (context framing + context), the question last"""
+        return [f"{CONTEXT_HEADER}\n{context}", f"Question: {query}\n\n{ANSWER_INSTRUCTIONS}"]
+    
+    def _openai_messages(self, query: str, context: str) -> List[Dict[str, str]]:
+        """System + context framing form the stable prefix; the question is the final message"""
+        return [
+            {"role": "system", "content": SYSTEM_INSTRUCTION},
+            {"role": "user", "content": f"{CONTEXT_HEADER}\n{context}"},
+            {"role": "user", "content": f"Question: {query}\n\n{ANSWER_INSTRUCTIONS}"}
+        ]
     
     async def _generate_gemini_answer(self, query: str, context: str) -> str:
         """Generate answer using Gemini 2.0 Flash"""
-        try:
-            # Create a comprehensive prompt for economic research queries
-            system_instruction = """You are an expert AI assistant specializing in economic research and business insights for Alberta, Canada. You help users understand economic data, trends, and business conditions based on research reports.
-
-Your responses should be:
-- Accurate and based solely on the provided context
-- Well-structured and easy to understand
-- Professional but accessible
-- Focused on actionable insights when possible
-- Clear about limitations if information is incomplete
-
-If the context doesn't contain enough information to answer the question, say so clearly."""
-
-            user_prompt = f"""Context from economic research documents:
-{context}
-
-Question: {query}
-
-Please provide a comprehensive answer based on the context above. If specific data or statistics are mentioned, include them in your response. If the context doesn't fully address the question, clearly state what information is missing."""
-
-            # Run in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            
-            def _generate_sync():
-                model = genai.GenerativeModel(
-                    model_name=self.llm_model,
-                    system_instruction=system_instruction
-                )
-                
-                response = model.generate_content(
-                    user_prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.3,  # Lower temperature for more factual responses
-                        max_output_tokens=1000,
-                        top_p=0.8,
-                        top_k=40
-                    )
-                )
-                return response.text
-            
-            answer = await loop.run_in_executor(None, _generate_sync)
-            return answer.strip()
-            
-        except Exception as e:
-            logger.error(f"Error generating Gemini answer: {str(e)}")
-            # Fallback to OpenAI if available
-            if self.openai_client:
-                return await self._generate_openai_answer(query, context)
-            return self._generate_fallback_answer(context)
+        response = await self._gemini_model.generate_content_async(
+            self._gemini_prompt(query, context),
+            generation_config=self._gemini_generation_config
+        )
+        return response.text.strip()
     
     async def _generate_openai_answer(self, query: str, context: str) -> str:
         """Generate answer using OpenAI GPT (fallback)"""
+        response = await self.openai_client.chat.completions.create(
+            model=self.llm_model,
+            messages=self._openai_messages(query, context),
+            temperature=0.3,  # Lower temperature for more factual responses
+            max_tokens=1000
+        )
+        
+        return response.choices[0].message.content.strip()
+    
+    async def _stream_answer(self, query: str, context: str) -> AsyncIterator[Tuple[str, bool]]:
+        """Yield (text, produced by the LLM) pieces of the answer as they are generated"""
+        streamed = False
         try:
-            # Create a comprehensive prompt for economic research queries
-            system_prompt = """You are an expert AI assistant specializing in economic research and business insights for Alberta, Canada. You help users understand economic data, trends, and business conditions based on research reports.
-
-Your responses should be:
-- Accurate and based solely on the provided context
-- Well-structured and easy to understand
-- Professional but accessible
-- Focused on actionable insights when possible
-- Clear about limitations if information is incomplete
-
-If the context doesn't contain enough information to answer the question, say so clearly."""
-
-            user_prompt = f"""Context from economic research documents:
-{context}
-
-Question: {query}
-
-Please provide a comprehensive answer based on the context above. If specific data or statistics are mentioned, include them in your response. If the context doesn't fully address the question, clearly state what information is missing."""
-
-            response = self.openai_client.chat.completions.create(
-                model=self.llm_model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.3,  # Lower temperature for more factual responses
-                max_tokens=1000
-            )
-            
-            return response.choices[0].message.content.strip()
+            if self.gemini_client:
+                response = await self._gemini_model.generate_content_async(
+                    self._gemini_prompt(query, context),
+                    generation_config=self._gemini_generation_config,
+                    stream=True
+                )
+                async for chunk in response:
+                    streamed = True
+                    yield chunk.text, True
+                return
             
+            if self.openai_client:
+                stream = await self.openai_client.chat.completions.create(
+                    model=self.llm_model,
+                    messages=self._openai_messages(query, context),
+                    temperature=0.3,  # Lower temperature for more factual responses
+                    max_tokens=1000,
+                    stream=True
+                )
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        streamed = True
+                        yield delta, True
+                return
         except Exception as e:
-            logger.error(f"Error generating OpenAI answer: {str(e)}")
-            return self._generate_fallback_answer(context)
+            logger.error(f"Error streaming answer: {str(e)}")
+            if streamed:
+                raise
+        
+        # No LLM available, or streaming failed before any text: use the non-streaming chain and its fallbacks
+        yield await self._generate_answer(query, context)
     
     def _generate_fallback_answer(self, context: str) -> str:
         """Generate a fallback answer when LLM is not available"""
         if not context:
             return "I couldn't find relevant information to answer your question."
         
-        # Simple extractive approach - return relevant context with some formatting
-        lines = context.split('\n')
-        relevant_lines = [line.strip() for line in lines if line.strip() and not line.startswith('[Source')]
+        # Simple extractive approach - return the first few source passages with some formatting
+        segments = _SOURCE_HEADER_RE.split(context, maxsplit=4)[1:4]
+        preview = ' '.join(' '.join(segment.split()) for segment in segments if segment.strip())
         
-        if relevant_lines:
-            preview = ' '.join(relevant_lines[:3])  # Take first few sentences
+        if preview:
             if len(preview) > 500:
                 preview = preview[:500] + "..."
             
@@ -261,30 +410,27 @@ Please provide a comprehensive answer based on the context above. If specific da
         
         return "I found some relevant information but couldn't generate a detailed response. Please check the system configuration."
     
-    async def _format_sources(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Format source information for the response"""
-        sources = []
-        
-        seen_docs = set()  # To avoid duplicate documents
+    def _format_sources(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Format source information for the response (one entry per document, best chunk wins)"""
+        best_by_doc: Dict[Any, Dict[str, Any]] = {}
         
         for chunk in chunks:
-            document = chunk.get('documents', {})
+            document = chunk.get('documents') or {}
             doc_id = document.get('id')
+            score = chunk.get('similarity_score', 0.0)
             
-            if doc_id not in seen_docs:
-                sources.append({
+            best = best_by_doc.get(doc_id)
+            if best is None or score > best['relevance_score']:
+                best_by_doc[doc_id] = {
                     "document_id": doc_id,
                     "title": document.get('title', 'Unknown Document'),
                     "filename": document.get('filename', ''),
                     "page_number": chunk.get('page_number'),
-                    "relevance_score": chunk.get('similarity_score', 0.0)
-                })
-                seen_docs.add(doc_id)
+                    "relevance_score": score
+                }
         
         # Sort by relevance score
-        sources.sort(key=lambda x: x['relevance_score'], reverse=True)
-        
-        return sources
+        return sorted(best_by_doc.values(), key=itemgetter('relevance_score'), reverse=True)
     
     def _calculate_confidence(self, chunks: List[Dict[str, Any]], answer: str) -> float:
         """Calculate confidence score for the response"""
@@ -296,7 +442,10 @@ Please provide a comprehensive answer based on the context above. If specific da
         # 2. Average similarity scores
         # 3. Answer length (longer answers might indicate more comprehensive info)
         
-        avg_similarity = sum(chunk.get('similarity_score', 0.0) for chunk in chunks) / len(chunks)
+        scores = np.fromiter(
+            (chunk.get('similarity_score', 0.0) for chunk in chunks), dtype=np.float32, count=len(chunks)
+        )
+        avg_similarity = float(scores.mean())
         
         # Normalize factors
         chunk_count_factor = min(len(chunks) / 3.0, 1.0)  # Diminishing returns after 3 chunks
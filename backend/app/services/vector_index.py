@@ -0,0 +1,128 @@
+import os
+import json
+import math
+import tempfile
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+import numpy as np
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+class FaissVectorIndex:
+    """In-process ANN index over chunk embeddings (IVF + 4-bit fast-scan PQ)"""
+    
+    # Below this many vectors an exact flat index is both faster and trainable
+    MIN_VECTORS_FOR_IVF = 10_000
+    
+    def __init__(self, index_path: str, nprobe: int = 16):
+        self.index_path = index_path
+        self.nprobe = nprobe
+        self.index = None
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _load(self):
+        """Load a previously persisted index from disk"""
+        if os.path.exists(self.index_path):
+            try:
+                self.index = self._configure(faiss.read_index(self.index_path))
+                logger.info(f"Loaded FAISS index with {self.index.ntotal} vectors")
+            except Exception as e:
+                logger.warning(f"Failed to load FAISS index: {str(e)}")
+                self.index = None
+    
+    def _configure(self, index):
+        """Apply search-time parameters (IVF layouts only)"""
+        if hasattr(index, "nprobe"):
+            index.nprobe = self.nprobe
+        return index
+    
+    @property
+    def ready(self) -> bool:
+        return self.index is not None and self.index.ntotal > 0
+    
+    def _factory_string(self, count: int, dimension: int) -> str:
+        """Pick an index layout that can be trained on the current corpus size"""
+        if count < self.MIN_VECTORS_FOR_IVF or dimension % 64:
+            return "Flat"
+        nlist = min(1024, 2 ** int(math.log2(math.sqrt(count))))
+        return f"IVF{nlist},PQ64x4fs"  # 64 sub-quantizers, 4-bit fast-scan codes
+    
+    def build(self, rows: List[Tuple[int, List[float]]]):
+        """Rebuild the index from (chunk_id, embedding) pairs and persist it"""
+        if not rows:
+            return
+        ids = np.fromiter((chunk_id for chunk_id, _ in rows), dtype=np.int64, count=len(rows))
+        vectors = np.asarray([vector for _, vector in rows], dtype=np.float32)
+        faiss.normalize_L2(vectors)  # Inner product on unit vectors == cosine
+        
+        factory = self._factory_string(*vectors.shape)
+        if factory == "Flat":
+            factory = "IDMap2,Flat"  # Flat indexes need an id map for chunk ids
+        index = faiss.index_factory(vectors.shape[1], factory, faiss.METRIC_INNER_PRODUCT)
+        if not index.is_trained:
+            index.train(vectors)
+        index.add_with_ids(vectors, ids)
+        self._configure(index)
+        
+        self._persist(index)
+        with self._lock:
+            self.index = index
+        logger.info(f"Built FAISS index ({factory}) with {index.ntotal} vectors")
+    
+    def _persist(self, index):
+        """Write the index to a temp file and atomically swap it in, so readers never see a partial file"""
+        directory = os.path.dirname(os.path.abspath(self.index_path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".faiss-", dir=directory)
+        os.close(fd)
+        try:
+            faiss.write_index(index, tmp_path)
+            os.replace(tmp_path, self.index_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
+    def search(self, query_embedding: np.ndarray, limit: int, threshold: float) -> List[Dict[str, Any]]:
+        """Return chunk ids and cosine similarities above the threshold"""
+        query = np.asarray([query_embedding], dtype=np.float32)
+        faiss.normalize_L2(query)
+        with self._lock:
+            index = self.index
+        scores, ids = index.search(query, limit)
+        return [
+            {"chunk_id": int(chunk_id), "similarity": float(score)}
+            for chunk_id, score in zip(ids[0], scores[0])
+            if chunk_id != -1 and score > threshold
+        ]
+
+def load_embedding_rows(supabase, page_size: int = 1000) -> List[Tuple[int, List[float]]]:
+    """Page through all stored embeddings in Supabase"""
+    rows = []
+    start = 0
+    while True:
+        result = supabase.table("embeddings").select("chunk_id, embedding_vector").range(
+            start, start + page_size - 1
+        ).execute()
+        batch = result.data or []
+        for row in batch:
+            vector = row["embedding_vector"]
+            # pgvector types are returned as their text form, e.g. "[0.1,0.2,...]"
+            rows.append((row["chunk_id"], json.loads(vector) if isinstance(vector, str) else vector))
+        if len(batch) < page_size:
+            return rows
+        start += page_size
+
+def create_vector_index() -> Optional[FaissVectorIndex]:
+    """Create the FAISS index when FAISS_INDEX_PATH is configured and faiss is installed"""
+    index_path = os.getenv("FAISS_INDEX_PATH")
+    if not index_path or not FAISS_AVAILABLE:
+        return None
+    return FaissVectorIndex(index_path, nprobe=int(os.getenv("FAISS_NPROBE", "16")))
@@ -0,0 +1,193 @@
+import os
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+import logging
+import numpy as np
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+class LRUCache:
+    """Small in-process LRU cache backed by an OrderedDict, with optional per-entry expiry"""
+    
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl  # Seconds an entry stays valid (None: until evicted)
+        self._data: "OrderedDict[Hashable, Tuple[Optional[float], Any]]" = OrderedDict()
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a cached value and mark it as recently used"""
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        expires_at, value = self._data[key]
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        return value
+    
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full"""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def clear(self):
+        self._data.clear()
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+class SemanticCache:
+    """Fixed-size cache of results keyed by query embedding, matched by cosine similarity"""
+    
+    def __init__(self, maxsize: int = 500, threshold: float = 0.97, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl  # Seconds an entry stays valid (None: until overwritten)
+        self._matrix: Optional[np.ndarray] = None  # Unit-length embeddings, one row per slot
+        self._entries: list = [None] * maxsize
+        self._next = 0
+        self._count = 0
+    
+    def get(self, embedding: np.ndarray, tag: Hashable = None) -> Any:
+        """Return the value stored for the most similar cached embedding above the threshold"""
+        if not self._count:
+            return None
+        query = self._normalize(embedding)
+        if query is None or query.shape[0] != self._matrix.shape[1]:
+            return None
+        similarities = self._matrix[:self._count] @ query
+        best = int(np.argmax(similarities))
+        entry_tag, value, expires_at = self._entries[best]
+        if similarities[best] < self.threshold or entry_tag != tag:
+            return None
+        if expires_at is not None and expires_at <= time.monotonic():
+            return None
+        return value
+    
+    def set(self, embedding: np.ndarray, value: Any, tag: Hashable = None):
+        """Store a value, overwriting the oldest slot when full"""
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+        if self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+            self._matrix = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+            self._next = self._count = 0
+        self._matrix[self._next] = vector
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._entries[self._next] = (tag, value, expires_at)
+        self._next = (self._next + 1) % self.maxsize
+        self._count = min(self._count + 1, self.maxsize)
+    
+    def clear(self):
+        self._entries = [None] * self.maxsize
+        self._next = self._count = 0
+    
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+def query_cache_key(query: str, *parts: Any) -> str:
+    """Stable cache key for a user query (case and surrounding whitespace insensitive)"""
+    normalized = "|".join([*(str(part) for part in parts), query.strip().lower()])
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def content_hash_key(text: str, *parts: Any) -> bytes:
+    """Compact content hash for caching values derived from a text"""
+    payload = "|".join([*(str(part) for part in parts), text])
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
+
+class SQLiteEmbeddingStore:
+    """On-disk embedding cache so content-hash hits survive restarts"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes: "queue.Queue[tuple]" = queue.Queue()
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        # Writes go through a single background thread so callers never wait on disk
+        self._writer = threading.Thread(target=self._write_loop, name="embedding-cache-writer", daemon=True)
+        self._writer.start()
+    
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+    
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        try:
+            row = self._connection().execute(
+                "SELECT vector FROM embeddings WHERE key = ?", (key.hex(),)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache read failed: {str(e)}")
+            return None
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32)
+    
+    def set(self, key: bytes, vector: np.ndarray):
+        self._writes.put((key.hex(), np.asarray(vector, dtype=np.float32).tobytes()))
+    
+    def _write_loop(self):
+        conn = self._connection()
+        while True:
+            rows = [self._writes.get()]
+            # Drain whatever else is pending into the same transaction
+            while True:
+                try:
+                    rows.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache write failed: {str(e)}")
+
+def create_embedding_store() -> Optional[SQLiteEmbeddingStore]:
+    """Create the on-disk embedding cache when EMBEDDING_CACHE_PATH is configured"""
+    path = os.getenv("EMBEDDING_CACHE_PATH")
+    if not path:
+        return None
+    try:
+        return SQLiteEmbeddingStore(path)
+    except Exception as e:
+        logger.warning(f"Failed to open embedding cache: {str(e)}")
+        return None
+
+def create_redis_client() -> Optional[Any]:
+    """Create an asyncio Redis client when REDIS_URL is configured and redis is installed"""
+    redis_url = os.getenv("REDIS_URL")
+    if not redis_url or not REDIS_AVAILABLE:
+        return None
+    try:
+        return aioredis.from_url(redis_url)
+    except Exception as e:
+        logger.warning(f"Failed to initialize Redis client: {str(e)}")
+        return None
@@ -2,12 +2,22 @@ import os
 import asyncio
 from typing import Dict, Any, List
 import logging
+from pathlib import Path
 from ..services.database import db_service
 from ..services.document_processor import document_processor
-from ..services.embedding_service import embedding_service
+from ..services.embedding_service import embedding_service, normalize
 
 logger = logging.getLogger(__name__)
 
+# Rows per Supabase insert request when storing chunks and embeddings
+INSERT_BATCH_SIZE = 500
+
+# Embedding requests in flight at once (batch size comes from the embedding provider)
+EMBEDDING_CONCURRENCY = 8
+
+# Sample PDFs ingested at once by process_sample_documents
+SAMPLE_DOCUMENT_CONCURRENCY = 4
+
 # Ensure db_service is initialized
 if db_service is None:
     raise RuntimeError("Database service could not be initialized.")
@@ -24,9 +34,8 @@ class FileProcessor:
             # Step 1: Create document record
             file_size = len(file_content)
             
-            # Extract title from document content
-            full_text, pages_data = await document_processor.extract_text_from_pdf(file_content)
-            title = await document_processor.get_document_title(full_text, filename)
+            # Extract text, title and chunks in one worker call (the full text never leaves the worker)
+            title, chunks, pages_processed = await document_processor.process_pdf(file_content, filename)
             
             # Create document in database
             document = await db_service.create_document(title, filename, file_size, content_type)
@@ -36,57 +45,52 @@ class FileProcessor:
             document_id = document["id"]
             logger.info(f"Created document record with ID: {document_id}")
             
-            # Step 2: Create intelligent chunks
-            chunks = await document_processor.create_intelligent_chunks(full_text, pages_data)
+            # Step 2: Intelligent chunks were created alongside text extraction
             logger.info(f"Created {len(chunks)} chunks for document")
             
-            # Step 3: Store chunks in database
+            # Step 3: Store chunks in database (bulk inserts)
             chunk_records = []
-            for chunk_data in chunks:
-                chunk_record = await db_service.create_document_chunk(
-                    document_id=document_id,
-                    chunk_text=chunk_data["chunk_text"],
-                    chunk_index=chunk_data["chunk_index"],
-                    page_number=chunk_data.get("page_number"),
-                    metadata=chunk_data.get("metadata")
-                )
-                if chunk_record:
-                    chunk_records.append(chunk_record)
+            for i in range(0, len(chunks), INSERT_BATCH_SIZE):
+                chunk_records.extend(await db_service.create_document_chunks_bulk([
+                    {
+                        "document_id": document_id,
+                        "chunk_text": chunk_data["chunk_text"],
+                        "chunk_index": chunk_data["chunk_index"],
+                        "page_number": chunk_data.get("page_number"),
+                        "metadata": chunk_data.get("metadata")
+                    }
+                    for chunk_data in chunks[i:i + INSERT_BATCH_SIZE]
+                ]))
             
             logger.info(f"Stored {len(chunk_records)} chunks in database")
             
-            # Step 4: Generate embeddings for chunks
-            embeddings_created = 0
+            # Step 4: Generate embeddings for chunks (concurrent batches, bounded by a semaphore)
+            # and store them as they arrive, so database writes overlap with embedding calls
             embedding_model_info = embedding_service.get_model_info()
-            
-            # Process embeddings in batches to avoid overwhelming the API
-            batch_size = 10
-            for i in range(0, len(chunk_records), batch_size):
-                batch_chunks = chunk_records[i:i + batch_size]
-                batch_texts = [chunk["chunk_text"] for chunk in batch_chunks]
-                
+            semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+            batch_size = embedding_service.max_batch_size()
+            batches = [
+                chunk_records[i:i + batch_size]
+                for i in range(0, len(chunk_records), batch_size)
+            ]
+            embedding_queue: asyncio.Queue = asyncio.Queue()
+            
+            async def _produce_embeddings():
                 try:
-                    # Generate batch embeddings
-                    batch_embeddings = await embedding_service.generate_batch_embeddings(batch_texts)
-                    
-                    # Store embeddings in database
-                    for chunk, embedding in zip(batch_chunks, batch_embeddings):
-                        embedding_record = await db_service.create_embedding(
-                            chunk_id=chunk["id"],
-                            embedding_vector=embedding,
-                            model_name=embedding_model_info["model_name"]
+                    await asyncio.gather(*[
+                        self._embed_chunk_batch(
+                            batch_number, batch_chunks, embedding_model_info["model_name"], semaphore, embedding_queue
                         )
-                        if embedding_record:
-                            embeddings_created += 1
-                    
-                    logger.info(f"Processed batch {i//batch_size + 1}, embeddings created: {embeddings_created}")
-                    
-                    # Small delay to be respectful to APIs
-                    await asyncio.sleep(0.1)
-                    
-                except Exception as e:
-                    logger.error(f"Error processing embedding batch {i//batch_size + 1}: {str(e)}")
-                    continue
+                        for batch_number, batch_chunks in enumerate(batches, 1)
+                    ])
+                finally:
+                    embedding_queue.put_nowait(None)  # No more batches
+            
+            producer = asyncio.create_task(_produce_embeddings())
+            try:
+                embeddings_created = await self._store_embedding_batches(embedding_queue)
+            finally:
+                producer.cancel()  # Only matters if storing failed part way
             
             # Step 5: Mark document as processed
             await db_service.update_document_processed(document_id, True)
@@ -99,7 +103,7 @@ class FileProcessor:
                 "title": title,
                 "chunks_created": len(chunk_records),
                 "embeddings_created": embeddings_created,
-                "pages_processed": len(pages_data)
+                "pages_processed": pages_processed
             }
             
         except Exception as e:
@@ -115,26 +119,63 @@ class FileProcessor:
                 "filename": filename
             }
     
+    async def _embed_chunk_batch(self, batch_number: int, batch_chunks: List[Dict[str, Any]], model_name: str,
+                                 semaphore: asyncio.Semaphore, embedding_queue: asyncio.Queue):
+        """Embed one batch of stored chunks and queue embedding rows ready for insertion"""
+        async with semaphore:
+            try:
+                batch_embeddings = await embedding_service.generate_batch_embeddings(
+                    [chunk["chunk_text"] for chunk in batch_chunks]
+                )
+            except Exception as e:
+                logger.error(f"Error processing embedding batch {batch_number}: {str(e)}")
+                return
+        
+        logger.info(f"Processed embedding batch {batch_number} ({len(batch_embeddings)} embeddings)")
+        embedding_queue.put_nowait([
+            {
+                "chunk_id": chunk["id"],
+                "embedding_vector": normalize(embedding),
+                "model_name": model_name
+            }
+            for chunk, embedding in zip(batch_chunks, batch_embeddings)
+        ])
+    
+    async def _store_embedding_batches(self, embedding_queue: asyncio.Queue) -> int:
+        """Insert queued embedding rows until the producer signals completion"""
+        embeddings_created = 0
+        while True:
+            rows = await embedding_queue.get()
+            if rows is None:
+                return embeddings_created
+            for i in range(0, len(rows), INSERT_BATCH_SIZE):
+                embeddings_created += await db_service.create_embeddings_bulk(rows[i:i + INSERT_BATCH_SIZE])
+    
     async def process_sample_documents(self, samples_dir: str = "samples") -> List[Dict[str, Any]]:
         """Process all PDF documents in the samples directory"""
-        results = []
-        
         if not os.path.exists(samples_dir):
             logger.error(f"Samples directory not found: {samples_dir}")
-            return results
+            return []
         
         # Get all PDF files from samples directory
         pdf_files = [f for f in os.listdir(samples_dir) if f.lower().endswith('.pdf')]
         
         logger.info(f"Found {len(pdf_files)} PDF files to process")
         
-        for filename in pdf_files:
+        # Files are ingested concurrently; results keep the directory listing order
+        semaphore = asyncio.Semaphore(SAMPLE_DOCUMENT_CONCURRENCY)
+        return list(await asyncio.gather(*(
+            self._process_sample_document(samples_dir, filename, semaphore) for filename in pdf_files
+        )))
+    
+    async def _process_sample_document(self, samples_dir: str, filename: str, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        """Read one sample PDF without blocking the event loop and run it through the pipeline"""
+        async with semaphore:
             try:
                 file_path = os.path.join(samples_dir, filename)
                 
-                # Read file content
-                with open(file_path, 'rb') as f:
-                    file_content = f.read()
+                # Read file content in a worker thread so the event loop keeps running
+                file_content = await asyncio.to_thread(Path(file_path).read_bytes)
                 
                 # Process the file
                 result = await self.process_uploaded_file(
@@ -143,33 +184,33 @@ class FileProcessor:
                     content_type="application/pdf"
                 )
                 
-                results.append(result)
                 logger.info(f"Processed {filename}: {'Success' if result['success'] else 'Failed'}")
+                return result
                 
             except Exception as e:
                 logger.error(f"Error processing file {filename}: {str(e)}")
-                results.append({
+                return {
                     "success": False,
                     "error": str(e),
                     "filename": filename
-                })
-        
-        return results
+                }
     
-    async def get_processing_status(self) -> Dict[str, Any]:
-        """Get status of document processing"""
+    async def get_processing_status(self, include_documents: bool = False) -> Dict[str, Any]:
+        """Get status of document processing (counts are aggregated by the database)"""
         try:
-            documents = await db_service.list_documents()
+            total_docs, processed_docs = await asyncio.gather(
+                db_service.count_documents(),
+                db_service.count_documents(processed=True)
+            )
             
-            total_docs = len(documents)
-            processed_docs = len([doc for doc in documents if doc.get('processed', False)])
-            
-            return {
+            status = {
                 "total_documents": total_docs,
                 "processed_documents": processed_docs,
-                "pending_documents": total_docs - processed_docs,
-                "documents": documents
+                "pending_documents": total_docs - processed_docs
             }
+            if include_documents:
+                status["documents"] = await db_service.list_documents()
+            return status
             
         except Exception as e:
             logger.error(f"Error getting processing status: {str(e)}")
@@ -0,0 +1,83 @@
+import logging
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _mmr_kernel(query_emb, chunk_embs, lambda_, k):
+        """Greedy MMR selection over unit-length embeddings (dot product == cosine)"""
+        n, dim = chunk_embs.shape
+        k = min(k, n)
+        relevance = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            total = np.float32(0.0)
+            for j in range(dim):
+                total += chunk_embs[i, j] * query_emb[j]
+            relevance[i] = total
+        
+        # Highest similarity of each candidate to anything already selected
+        redundancy = np.zeros(n, dtype=np.float32)
+        chosen = np.zeros(n, dtype=np.bool_)
+        selected = np.empty(k, dtype=np.int64)
+        for step in range(k):
+            best = -1
+            best_score = -np.inf
+            for i in range(n):
+                if chosen[i]:
+                    continue
+                score = lambda_ * relevance[i] - (1.0 - lambda_) * redundancy[i]
+                if score > best_score:
+                    best_score = score
+                    best = i
+            selected[step] = best
+            chosen[best] = True
+            
+            for i in prange(n):
+                if chosen[i]:
+                    continue
+                total = np.float32(0.0)
+                for j in range(dim):
+                    total += chunk_embs[i, j] * chunk_embs[best, j]
+                if step == 0 or total > redundancy[i]:
+                    redundancy[i] = total
+        return selected
+else:
+    def _mmr_kernel(query_emb, chunk_embs, lambda_, k):
+        """Greedy MMR selection over unit-length embeddings (dot product == cosine)"""
+        n = chunk_embs.shape[0]
+        k = min(k, n)
+        relevance = chunk_embs @ query_emb
+        redundancy = np.zeros(n, dtype=np.float32)
+        chosen = np.zeros(n, dtype=bool)
+        selected = np.empty(k, dtype=np.int64)
+        for step in range(k):
+            scores = lambda_ * relevance - (1.0 - lambda_) * redundancy
+            scores[chosen] = -np.inf
+            best = int(np.argmax(scores))
+            selected[step] = best
+            chosen[best] = True
+            similarities = chunk_embs @ chunk_embs[best]
+            redundancy = similarities if step == 0 else np.maximum(redundancy, similarities)
+        return selected
+
+def mmr(query_emb: np.ndarray, chunk_embs: np.ndarray, lambda_: float = 0.7, k: int = 5) -> np.ndarray:
+    """Maximal Marginal Relevance: indices of k chunks balancing query relevance and diversity"""
+    query_emb = np.ascontiguousarray(query_emb, dtype=np.float32)
+    chunk_embs = np.ascontiguousarray(chunk_embs, dtype=np.float32)
+    if chunk_embs.ndim != 2 or not chunk_embs.shape[0] or k <= 0:
+        return np.empty(0, dtype=np.int64)
+    return _mmr_kernel(query_emb, chunk_embs, np.float32(lambda_), k)
+
+def warm_up():
+    """Compile the MMR kernel ahead of the first user query"""
+    try:
+        mmr(np.ones(1, dtype=np.float32), np.ones((1, 1), dtype=np.float32), k=1)
+    except Exception as e:
+        logger.warning(f"MMR warm-up failed: {str(e)}")
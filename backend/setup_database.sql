@@ -1,4 +1,4 @@
--- Enable the pgvector extension for vector similarity search
+-- Enable the pgvector extension for vector similarity search (0.7+ for halfvec)
 CREATE EXTENSION IF NOT EXISTS vector;
 
 -- Documents table
@@ -28,11 +28,16 @@ CREATE TABLE IF NOT EXISTS document_chunks (
 CREATE TABLE IF NOT EXISTS embeddings (
     id SERIAL PRIMARY KEY,
     chunk_id INTEGER REFERENCES document_chunks(id) ON DELETE CASCADE,
-    embedding_vector vector(768), -- Gemini text-embedding-004 dimension
+    embedding_vector halfvec(768), -- Gemini text-embedding-004 dimension, stored as 16-bit floats
     model_name TEXT NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Timestamps are always assigned by Postgres (clients do not send them)
+ALTER TABLE documents ALTER COLUMN upload_date SET DEFAULT NOW();
+ALTER TABLE document_chunks ALTER COLUMN created_at SET DEFAULT NOW();
+ALTER TABLE embeddings ALTER COLUMN created_at SET DEFAULT NOW();
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_documents_processed ON documents(processed);
 CREATE INDEX IF NOT EXISTS idx_documents_created_at ON documents(created_at);
@@ -40,14 +45,39 @@ CREATE INDEX IF NOT EXISTS idx_document_chunks_document_id ON document_chunks(do
 CREATE INDEX IF NOT EXISTS idx_document_chunks_chunk_index ON document_chunks(document_id, chunk_index);
 CREATE INDEX IF NOT EXISTS idx_embeddings_chunk_id ON embeddings(chunk_id);
 
--- Create vector similarity search index (this may take a while for large datasets)
-CREATE INDEX IF NOT EXISTS embeddings_vector_idx ON embeddings USING ivfflat (embedding_vector vector_cosine_ops);
+-- Migrate existing databases from vector(768) to halfvec(768). The old vector indexes
+-- are dropped first, since their operator classes don't accept halfvec
+DROP INDEX IF EXISTS embeddings_vector_idx;
+DROP INDEX IF EXISTS embeddings_vector_hnsw_idx;
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_attribute
+        WHERE attrelid = 'embeddings'::regclass
+            AND attname = 'embedding_vector'
+            AND NOT attisdropped
+            AND atttypid = 'vector'::regtype
+    ) THEN
+        ALTER TABLE embeddings ALTER COLUMN embedding_vector TYPE halfvec(768) USING embedding_vector::halfvec(768);
+    END IF;
+END
+$$;
+
+-- Create vector similarity search index (HNSW graph, this may take a while for large datasets)
+-- Embeddings are stored unit-length, so inner product ranks identically to cosine without per-row norms
+CREATE INDEX IF NOT EXISTS embeddings_vector_hnsw_ip_idx ON embeddings
+    USING hnsw (embedding_vector halfvec_ip_ops) WITH (m = 16, ef_construction = 64);
 
--- Function for similarity search
+-- Function for similarity search; include_embedding also returns the stored vectors
+-- (used for MMR re-ranking). The query is taken as halfvec so it is parsed straight into
+-- the column type; drop the older vector(768) signatures first
+DROP FUNCTION IF EXISTS similarity_search(vector, float, int);
+DROP FUNCTION IF EXISTS similarity_search(vector, float, int, boolean);
 CREATE OR REPLACE FUNCTION similarity_search(
-    query_embedding vector(768),
+    query_embedding halfvec(768),
     match_threshold float DEFAULT 0.7,
-    match_count int DEFAULT 5
+    match_count int DEFAULT 5,
+    include_embedding boolean DEFAULT false
 )
 RETURNS TABLE (
     chunk_id int,
@@ -56,25 +86,88 @@ RETURNS TABLE (
     page_number int,
     similarity float,
     title text,
-    filename text
+    filename text,
+    embedding_vector halfvec(768)
 )
 LANGUAGE plpgsql
 AS $$
 BEGIN
+    -- An HNSW scan returns at most hnsw.ef_search rows (default 40); MMR can ask for more
+    PERFORM set_config('hnsw.ef_search', GREATEST(40, LEAST(match_count, 1000))::text, true);
+    
     RETURN query
     SELECT 
         dc.id as chunk_id,
         dc.document_id,
         dc.chunk_text,
         dc.page_number,
-        (1 - (e.embedding_vector <=> query_embedding)) as similarity,
+        -(e.embedding_vector <#> query_embedding) as similarity,
         d.title,
-        d.filename
+        d.filename,
+        CASE WHEN include_embedding THEN e.embedding_vector END
     FROM embeddings e
     JOIN document_chunks dc ON e.chunk_id = dc.id
     JOIN documents d ON dc.document_id = d.id
-    WHERE (1 - (e.embedding_vector <=> query_embedding)) > match_threshold
-    ORDER BY e.embedding_vector <=> query_embedding
+    WHERE -(e.embedding_vector <#> query_embedding) > match_threshold
+    ORDER BY e.embedding_vector <#> query_embedding
+    LIMIT match_count;
+END;
+$$;
+
+-- Optional quantized search (enable with VECTOR_SEARCH_QUANTIZED=true): a 1-bit-per-dimension
+-- HNSW index finds candidates by Hamming distance (96 bytes per row instead of 1.5 KB),
+-- then candidates are re-ranked exactly with the halfvec inner product.
+-- The index is maintained on every insert, so create it only when enabling quantized search:
+-- CREATE INDEX IF NOT EXISTS embeddings_vector_binary_idx ON embeddings
+--     USING hnsw ((binary_quantize(embedding_vector)::bit(768)) bit_hamming_ops);
+
+DROP FUNCTION IF EXISTS similarity_search_quantized(vector, float, int, int);
+DROP FUNCTION IF EXISTS similarity_search_quantized(vector, float, int, int, boolean);
+CREATE OR REPLACE FUNCTION similarity_search_quantized(
+    query_embedding halfvec(768),
+    match_threshold float DEFAULT 0.7,
+    match_count int DEFAULT 5,
+    candidate_factor int DEFAULT 10,
+    include_embedding boolean DEFAULT false
+)
+RETURNS TABLE (
+    chunk_id int,
+    document_id int,
+    chunk_text text,
+    page_number int,
+    similarity float,
+    title text,
+    filename text,
+    embedding_vector halfvec(768)
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- An HNSW scan returns at most hnsw.ef_search rows (default 40), so widen it to the
+    -- requested candidate pool for this transaction (1000 is the pgvector maximum)
+    PERFORM set_config('hnsw.ef_search', LEAST(match_count * candidate_factor, 1000)::text, true);
+    
+    RETURN query
+    WITH candidates AS (
+        SELECT e.chunk_id, e.embedding_vector
+        FROM embeddings e
+        ORDER BY binary_quantize(e.embedding_vector)::bit(768) <~> binary_quantize(query_embedding)
+        LIMIT match_count * candidate_factor
+    )
+    SELECT 
+        dc.id as chunk_id,
+        dc.document_id,
+        dc.chunk_text,
+        dc.page_number,
+        -(c.embedding_vector <#> query_embedding) as similarity,
+        d.title,
+        d.filename,
+        CASE WHEN include_embedding THEN c.embedding_vector END
+    FROM candidates c
+    JOIN document_chunks dc ON c.chunk_id = dc.id
+    JOIN documents d ON dc.document_id = d.id
+    WHERE -(c.embedding_vector <#> query_embedding) > match_threshold
+    ORDER BY c.embedding_vector <#> query_embedding
     LIMIT match_count;
 END;
 $$;
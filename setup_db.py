@@ -1,55 +1,71 @@
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
-from supabase import create_client, Client
 import psycopg2
 
 # Load environment variables
 env_path = Path(__file__).parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
+SCHEMA_PATH = Path(__file__).parent / "backend" / "setup_database.sql"
+
+# Indexes vector search and document lookups depend on
+REQUIRED_INDEXES = (
+    "embeddings_vector_hnsw_ip_idx",
+    "idx_document_chunks_document_id",
+)
+
 def setup_database():
-    """Set up the database tables and functions"""
+    """Set up the database tables, indexes and functions (safe to run repeatedly)"""
     
-    # Get Supabase credentials
-    supabase_url = os.getenv("SUPABASE_URL")
-    supabase_key = os.getenv("SUPABASE_SECRET")  # Use service role key for admin operations
+    # Direct Postgres connection string (Supabase dashboard: Project Settings > Database)
+    db_url = os.getenv("SUPABASE_DB_URL")
     
-    if not supabase_url or not supabase_key:
-        print("Error: Supabase credentials not found!")
-        print("Make sure SUPABASE_URL and SUPABASE_SECRET are set in .env")
+    if not db_url:
+        print("Error: Database connection string not found!")
+        print("Make sure SUPABASE_DB_URL is set in .env")
         return False
     
-    # Create the tables using the REST API
+    conn = None
     try:
-        supabase: Client = create_client(supabase_url, supabase_key)
-        
-        print("Creating documents table...")
-        # Create documents table first
-        result = supabase.table('documents').select('*').limit(1).execute()
-        print("✓ Documents table exists or created")
-        
-    except Exception as e:
-        print(f"Tables don't exist, let's create them manually...")
+        # The connection context manager only ends the transaction; the connection is closed below
+        conn = psycopg2.connect(db_url)
+        with conn:
+            with conn.cursor() as cur:
+                print("Applying schema from backend/setup_database.sql...")
+                # Every statement in the schema is idempotent (IF NOT EXISTS / OR REPLACE)
+                cur.execute(SCHEMA_PATH.read_text())
+                
+                # Confirm the indexes exist with one catalog query instead of probing tables
+                cur.execute(
+                    "SELECT indexname FROM pg_catalog.pg_indexes "
+                    "WHERE schemaname = 'public' AND indexname = ANY(%s)",
+                    (list(REQUIRED_INDEXES),)
+                )
+                existing = {row[0] for row in cur.fetchall()}
+                missing = [name for name in REQUIRED_INDEXES if name not in existing]
+                if missing:
+                    print(f"Error: indexes missing after setup: {', '.join(missing)}")
+                    return False
+                
+                # Refresh planner statistics so the new indexes are used right away
+                cur.execute("ANALYZE documents, document_chunks, embeddings")
         
-        # Try to create tables using simple approach
-        print("Creating basic tables via Supabase client...")
-        
-        # Let's create tables one by one
-        try:
-            # First, let's just try to insert a test document to see what happens
-            supabase: Client = create_client(supabase_url, supabase_key)
-            
-            print("Testing database connection...")
-            # This will fail if tables don't exist, but give us useful info
-            result = supabase.table('documents').select('count', count='exact').execute()
-            print(f"✓ Database connected. Documents count: {result.count}")
-            return True
-            
-        except Exception as e2:
-            print(f"Database connection test failed: {e2}")
-            print("Please create tables manually in Supabase dashboard using the SQL from backend/setup_database.sql")
-            return False
+        print("✓ Tables, indexes and functions are in place")
+        return True
+    
+    except OSError as e:
+        print(f"Could not read {SCHEMA_PATH}: {e}")
+        return False
+    except psycopg2.Error as e:
+        print(f"Database setup failed (SQLSTATE {e.pgcode}): {e.pgerror or e}")
+        return False
+    finally:
+        if conn is not None:
+            conn.close()
 
 if __name__ == "__main__":
-    setup_database() 
\ No newline at end of file
+    # Non-zero exit so deploy scripts can tell a failed setup apart
+    if not setup_database():
+        sys.exit(1)